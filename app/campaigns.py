@@ -0,0 +1,456 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List
+import csv
+import io
+import json
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import bindparam
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+# CSV columns accepted as the recipient, in order of preference
+CONTACT_COLUMNS = ("contact", "phone", "number", "name")
+
+
+def render_template(template: str, variables: Dict[str, str]) -> str:
+    """Fill {column} placeholders from a recipient's CSV row; unknown ones are left as is"""
+    return PLACEHOLDER_RE.sub(
+        lambda match: variables.get(match.group(1).lower(), match.group(0)), template
+    )
+
+
+def parse_contacts_csv(text: str) -> List[Dict]:
+    """Recipients from an uploaded CSV, one per distinct contact"""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise ValueError("The CSV file is empty")
+    columns = {name.strip().lower(): name for name in reader.fieldnames if name}
+    contact_column = next((columns[c] for c in CONTACT_COLUMNS if c in columns), None)
+    if contact_column is None:
+        raise ValueError(f"The CSV needs one of these columns: {', '.join(CONTACT_COLUMNS)}")
+
+    recipients = []
+    seen = set()
+    for row in reader:
+        contact = (row.get(contact_column) or "").strip()
+        if not contact or contact in seen:
+            continue
+        seen.add(contact)
+        variables = {
+            name.strip().lower(): (value or "").strip()
+            for name, value in row.items() if name
+        }
+        recipients.append({"contact": contact, "variables": variables})
+    return recipients
+
+
+class TokenBucket:
+    """Allows rate_per_second sends on average with bursts of up to capacity"""
+
+    def __init__(self, rate_per_second: float, capacity: int = 1):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event: threading.Event = None) -> bool:
+        """Block until a token is available; False if stop_event is set first"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class CampaignRun:
+    """Counters for a campaign while it is being sent in this process"""
+
+    def __init__(self, campaign_id: int):
+        self.campaign_id = campaign_id
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started = time.monotonic()
+        self.sent = 0
+        self.failed = 0
+        self.personalized = 0
+        self.personalize_seconds = 0.0
+
+
+def campaign_report(campaign, run: CampaignRun = None) -> Dict:
+    """Progress and throughput for a Campaign row, plus live counters if it is running here"""
+    done = (campaign.sent or 0) + (campaign.failed or 0)
+    end = campaign.completed_at or datetime.utcnow()
+    elapsed = (end - campaign.started_at).total_seconds() if campaign.started_at else None
+
+    report = {
+        "id": campaign.id,
+        "name": campaign.name,
+        "status": campaign.status,
+        "total": campaign.total,
+        "sent": campaign.sent,
+        "failed": campaign.failed,
+        "remaining": (campaign.total or 0) - done,
+        "rate_limit_per_minute": campaign.rate_per_minute,
+        "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+        "sent_per_minute": round(done / elapsed * 60, 2) if elapsed else None,
+    }
+    if run:
+        # Counters for this process's run, which excludes time spent stopped
+        run_elapsed = time.monotonic() - run.started
+        report["run"] = {
+            "sent": run.sent,
+            "failed": run.failed,
+            "sent_per_minute": round((run.sent + run.failed) / run_elapsed * 60, 2) if run_elapsed else None,
+            "avg_personalize_ms": round(run.personalize_seconds / run.personalized * 1000, 1)
+            if run.personalized else None,
+        }
+        rate = report["run"]["sent_per_minute"]
+        if rate and campaign.status == "running":
+            report["eta_seconds"] = round(report["remaining"] / rate * 60)
+    return report
+
+
+class CampaignRunner:
+    """Sends campaigns through the outbound queue at a rate-limited pace.
+
+    Recipients are walked in id order a batch at a time. While one batch is
+    being sent, the next is rendered and, if the campaign asks for it,
+    personalised on a worker pool, so AI latency stays off the send path.
+    Every recipient's text and outcome is checkpointed in the database,
+    so a restarted campaign continues from the first unsent recipient.
+    """
+
+    def __init__(self, outbound_queue, openai_handler, session_factory,
+                 on_progress: Callable[[Dict], None] = None):
+        self.outbound_queue = outbound_queue
+        self.openai_handler = openai_handler
+        self.session_factory = session_factory
+        self.on_progress = on_progress
+        self._runs: Dict[int, CampaignRun] = {}
+        self._lock = threading.Lock()
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="campaign-prefetch")
+        self._personalize_pool = ThreadPoolExecutor(
+            max_workers=config.CAMPAIGN_PERSONALIZE_WORKERS, thread_name_prefix="campaign-personalize"
+        )
+
+    def start(self, campaign_id: int) -> bool:
+        """Start or resume sending a campaign"""
+        from app.database import Campaign
+
+        with self._lock:
+            db = self.session_factory()
+            try:
+                campaign = db.get(Campaign, campaign_id)
+                if campaign is None or campaign.status in ("completed", "cancelled"):
+                    return False
+                campaign.status = "running"
+                campaign.started_at = campaign.started_at or datetime.utcnow()
+                db.commit()
+            finally:
+                db.close()
+
+            run = self._runs.get(campaign_id)
+            if run and run.thread.is_alive() and not run.stop_event.is_set():
+                return True
+            # A paused run may still be waiting on its last batch; the new run
+            # takes over once it has finished
+            previous = run if run and run.thread.is_alive() else None
+            run = self._runs[campaign_id] = CampaignRun(campaign_id)
+            run.thread = threading.Thread(target=self._run, args=(run, previous), daemon=True)
+            run.thread.start()
+        logger.info(f"Campaign {campaign_id} started")
+        return True
+
+    def pause(self, campaign_id: int) -> bool:
+        return self._halt(campaign_id, "paused")
+
+    def cancel(self, campaign_id: int) -> bool:
+        return self._halt(campaign_id, "cancelled")
+
+    def resume_running(self):
+        """Restart campaigns that were running when the app last stopped"""
+        from app.database import Campaign
+
+        db = self.session_factory()
+        try:
+            campaign_ids = [row.id for row in db.query(Campaign.id).filter(Campaign.status == "running")]
+        finally:
+            db.close()
+        for campaign_id in campaign_ids:
+            self.start(campaign_id)
+
+    def stop(self):
+        """Stop all sending threads; running campaigns resume on the next start"""
+        with self._lock:
+            runs = list(self._runs.values())
+        for run in runs:
+            run.stop_event.set()
+        for run in runs:
+            run.thread.join(timeout=10)
+        self._prefetch_pool.shutdown(wait=False)
+        self._personalize_pool.shutdown(wait=False)
+
+    def report(self, campaign) -> Dict:
+        """Progress and throughput for a Campaign row"""
+        return campaign_report(campaign, self._runs.get(campaign.id))
+
+    def _halt(self, campaign_id: int, status: str) -> bool:
+        from app.database import Campaign
+
+        run = self._runs.get(campaign_id)
+        if run:
+            run.stop_event.set()
+        db = self.session_factory()
+        try:
+            campaign = db.get(Campaign, campaign_id)
+            if campaign is None or campaign.status in ("completed", "cancelled"):
+                return False
+            campaign.status = status
+            db.commit()
+        finally:
+            db.close()
+        logger.info(f"Campaign {campaign_id} {status}")
+        self._publish(campaign_id)
+        return True
+
+    def _run(self, run: CampaignRun, previous: CampaignRun = None):
+        from app.database import Campaign
+
+        if previous:
+            previous.thread.join()
+            if run.stop_event.is_set():
+                return
+
+        db = self.session_factory()
+        try:
+            campaign = db.get(Campaign, run.campaign_id)
+            template, personalize = campaign.template, campaign.personalize
+            rate = campaign.rate_per_minute or config.CAMPAIGN_RATE_PER_MINUTE
+        finally:
+            db.close()
+
+        try:
+            self._recover_interrupted(run.campaign_id)
+            bucket = TokenBucket(rate / 60, config.CAMPAIGN_BURST)
+
+            batch = self._next_batch(run.campaign_id, 0)
+            prepared = self._prefetch_pool.submit(self._prepare, run, template, personalize, batch)
+            while batch and not run.stop_event.is_set():
+                ready = prepared.result()
+                # Prepare the next batch while this one is being sent
+                next_batch = self._next_batch(run.campaign_id, batch[-1]["id"])
+                prepared = self._prefetch_pool.submit(self._prepare, run, template, personalize, next_batch)
+                self._send(run, bucket, ready)
+                self._publish(run.campaign_id)
+                batch = next_batch
+
+            if not run.stop_event.is_set():
+                self._complete(run.campaign_id)
+        except Exception as e:
+            logger.error(f"Campaign {run.campaign_id} stopped with an error: {e}")
+        finally:
+            self._publish(run.campaign_id)
+
+    def _next_batch(self, campaign_id: int, after_id: int) -> List[Dict]:
+        """The next unsent recipients after the send cursor"""
+        from app.database import CampaignRecipient
+
+        db = self.session_factory()
+        try:
+            rows = db.query(CampaignRecipient).filter(
+                CampaignRecipient.campaign_id == campaign_id,
+                CampaignRecipient.status.in_(("pending", "prepared")),
+                CampaignRecipient.id > after_id
+            ).order_by(CampaignRecipient.id).limit(config.CAMPAIGN_BATCH_SIZE).all()
+            return [
+                {
+                    "id": row.id,
+                    "contact": row.contact,
+                    "variables": json.loads(row.variables or "{}"),
+                    "message": row.message,
+                    "status": row.status,
+                }
+                for row in rows
+            ]
+        finally:
+            db.close()
+
+    def _prepare(self, run: CampaignRun, template: str, personalize: bool, batch: List[Dict]) -> List[Dict]:
+        """Render, optionally personalise, and save the text for a batch of recipients"""
+        pending = [recipient for recipient in batch if recipient["status"] == "pending"]
+        if not pending:
+            return batch
+
+        for recipient in pending:
+            recipient["message"] = render_template(template, recipient["variables"])
+        if personalize:
+            start = time.perf_counter()
+            messages = list(self._personalize_pool.map(self._personalize, pending))
+            run.personalize_seconds += time.perf_counter() - start
+            run.personalized += len(pending)
+            for recipient, message in zip(pending, messages):
+                recipient["message"] = message
+
+        for recipient in pending:
+            recipient["status"] = "prepared"
+        self._update_recipients([
+            {"recipient_id": r["id"], "message": r["message"], "status": "prepared"} for r in pending
+        ], ("message", "status"))
+        return batch
+
+    def _personalize(self, recipient: Dict) -> str:
+        extra = {
+            key: value for key, value in recipient["variables"].items()
+            if key not in ("template", "contact")
+        }
+        return self.openai_handler.generate_scheduled_message(recipient["message"], recipient["contact"], **extra)
+
+    def _send(self, run: CampaignRun, bucket: TokenBucket, batch: List[Dict]):
+        """Send a prepared batch at the campaign's rate and record each outcome"""
+        from app.database import Campaign
+
+        submitted = []
+        for recipient in batch:
+            if not bucket.acquire(run.stop_event):
+                break
+            # Mark each recipient just before it is queued, so a crash cannot send
+            # anyone twice and recipients never submitted stay prepared
+            self._update_recipients([{"recipient_id": recipient["id"], "status": "sending"}], ("status",))
+            job = self.outbound_queue.submit(recipient["contact"], recipient["message"], "bulk")
+            submitted.append((recipient, job))
+
+        results = []
+        sent = failed = 0
+        for recipient, job in submitted:
+            success = job.future.result()
+            results.append({
+                "recipient_id": recipient["id"],
+                "status": "sent" if success else "failed",
+                "sent_at": datetime.utcnow() if success else None,
+                "error": None if success else "Send failed",
+            })
+            if success:
+                sent += 1
+            else:
+                failed += 1
+        if not results:
+            return
+
+        self._update_recipients(results, ("status", "sent_at", "error"))
+        db = self.session_factory()
+        try:
+            db.query(Campaign).filter(Campaign.id == run.campaign_id).update({
+                Campaign.sent: Campaign.sent + sent,
+                Campaign.failed: Campaign.failed + failed,
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        run.sent += sent
+        run.failed += failed
+
+    def _recover_interrupted(self, campaign_id: int):
+        """Recipients left mid-send by a crash may or may not have received the message"""
+        from app.database import Campaign, CampaignRecipient
+
+        db = self.session_factory()
+        try:
+            interrupted = db.query(CampaignRecipient).filter(
+                CampaignRecipient.campaign_id == campaign_id,
+                CampaignRecipient.status == "sending"
+            ).update({
+                CampaignRecipient.status: "failed",
+                CampaignRecipient.error: "Interrupted before delivery was confirmed",
+            }, synchronize_session=False)
+            if interrupted:
+                db.query(Campaign).filter(Campaign.id == campaign_id).update(
+                    {Campaign.failed: Campaign.failed + interrupted}, synchronize_session=False
+                )
+                logger.warning(f"Campaign {campaign_id}: {interrupted} recipients were interrupted mid-send")
+            db.commit()
+        finally:
+            db.close()
+
+    def _complete(self, campaign_id: int):
+        from app.database import Campaign
+
+        db = self.session_factory()
+        try:
+            campaign = db.get(Campaign, campaign_id)
+            if campaign.status == "running":
+                campaign.status = "completed"
+                campaign.completed_at = datetime.utcnow()
+                db.commit()
+                logger.info(f"Campaign {campaign_id} completed: {campaign.sent} sent, {campaign.failed} failed")
+        finally:
+            db.close()
+
+    def _update_recipients(self, rows: List[Dict], columns):
+        """One executemany UPDATE for a batch of recipients"""
+        from app.database import CampaignRecipient
+
+        if not rows:
+            return
+        table = CampaignRecipient.__table__
+        db = self.session_factory()
+        try:
+            # Bind names must differ from the column names being set
+            db.execute(
+                table.update().where(table.c.id == bindparam("recipient_id")).values(
+                    {column: bindparam(f"new_{column}") for column in columns}
+                ),
+                [
+                    dict({f"new_{column}": row[column] for column in columns}, recipient_id=row["recipient_id"])
+                    for row in rows
+                ]
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _publish(self, campaign_id: int):
+        if not self.on_progress:
+            return
+        from app.database import Campaign
+
+        db = self.session_factory()
+        try:
+            campaign = db.get(Campaign, campaign_id)
+            if campaign:
+                self.on_progress(self.report(campaign))
+        except Exception as e:
+            logger.error(f"Error reporting campaign progress: {e}")
+        finally:
+            db.close()
+
+
+def create_campaign_rows(campaign_id: int, recipients: List[Dict]) -> List[Dict]:
+    """Insert parameters for a new campaign's recipients"""
+    return [
+        {
+            "campaign_id": campaign_id,
+            "contact": recipient["contact"],
+            "variables": json.dumps(recipient["variables"]),
+            "status": "pending",
+        }
+        for recipient in recipients
+    ]
@@ -0,0 +1,164 @@
+from typing import Callable, Dict, Hashable, List, Optional
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Turn:
+    """Consecutive messages from one contact, answered as a single turn"""
+
+    def __init__(self, key: Hashable, first_at: float):
+        self.key = key
+        self.items: List[Dict] = []
+        self.first_at = first_at
+        self.last_at = first_at
+        self.deadline = first_at
+
+    @property
+    def text(self) -> str:
+        return "\n".join(item["message"] for item in self.items)
+
+    @property
+    def last(self) -> Dict:
+        return self.items[-1]
+
+
+class MessageCoalescer:
+    """Debounces inbound messages per contact into turns.
+
+    Each message from a contact pushes its turn's deadline out to the
+    message time plus the debounce window, so a burst of short messages is
+    answered once. max_wait caps how long after its first message a turn
+    can be held, and a window of 0 (e.g. a rule's override) releases the
+    turn immediately. Turns are released from a background thread; the
+    *_due methods take an explicit time so traces can be replayed.
+    """
+
+    def __init__(self, on_turn: Callable[[Turn], None], window: float = None, max_wait: float = None):
+        self.on_turn = on_turn
+        self.window = config.COALESCE_WINDOW if window is None else window
+        self.max_wait = config.COALESCE_MAX_WAIT if max_wait is None else max_wait
+        self._open: Dict[Hashable, Turn] = {}
+        self._heap = []  # (deadline, sequence, turn)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self.running = False
+        self._thread = None
+        self.messages = 0
+        self.turns = 0
+        self.merged = 0  # Messages answered as part of an earlier message's turn
+        self.capped = 0  # Turns released by max_wait while messages were still arriving
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"Message coalescer started ({self.window}s window, {self.max_wait}s max wait)")
+
+    def stop(self):
+        """Stop the timer thread and release every held turn"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        self.flush_all()
+        logger.info("Message coalescer stopped")
+
+    def add(self, key: Hashable, item: Dict, window: float = None, now: float = None) -> Turn:
+        """Add a message ({"message": text, ...}) to its contact's open turn"""
+        now = time.time() if now is None else now
+        window = self.window if window is None else window
+        ready = None
+        with self._condition:
+            self.messages += 1
+            turn = self._open.get(key)
+            if turn is None:
+                turn = self._open[key] = Turn(key, now)
+            turn.items.append(item)
+            turn.last_at = now
+            turn.deadline = min(now + window, turn.first_at + self.max_wait)
+            if turn.deadline <= now:
+                del self._open[key]
+                ready = turn
+            else:
+                heapq.heappush(self._heap, (turn.deadline, next(self._sequence), turn))
+                if self._heap[0][2] is turn:
+                    self._condition.notify()
+        if ready:
+            self._emit(ready)
+        return turn
+
+    def flush_due(self, now: float = None) -> int:
+        """Release every turn whose deadline has passed; returns how many"""
+        now = time.time() if now is None else now
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, turn = heapq.heappop(self._heap)
+                # Skip entries superseded by a later message or an earlier release
+                if self._open.get(turn.key) is turn and turn.deadline == deadline:
+                    del self._open[turn.key]
+                    due.append(turn)
+        for turn in due:
+            self._emit(turn)
+        return len(due)
+
+    def flush_all(self) -> int:
+        with self._condition:
+            turns = list(self._open.values())
+            self._open.clear()
+            self._heap.clear()
+        for turn in turns:
+            self._emit(turn)
+        return len(turns)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._condition:
+            while self._heap and self._open.get(self._heap[0][2].key) is not self._heap[0][2]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _run(self):
+        while self.running:
+            deadline = self.next_deadline()
+            with self._condition:
+                if not self.running:
+                    break
+                if deadline is None:
+                    self._condition.wait(timeout=1)
+                    continue
+                delay = deadline - time.time()
+                if delay > 0:
+                    self._condition.wait(timeout=delay)
+                    continue
+            self.flush_due()
+
+    def _emit(self, turn: Turn):
+        self.turns += 1
+        self.merged += len(turn.items) - 1
+        if turn.deadline == turn.first_at + self.max_wait and len(turn.items) > 1:
+            self.capped += 1
+        try:
+            self.on_turn(turn)
+        except Exception as e:
+            logger.error(f"Error handling coalesced turn for {turn.key}: {e}")
+
+    def stats(self) -> Dict:
+        with self._condition:
+            pending = len(self._open)
+        return {
+            "window": self.window,
+            "max_wait": self.max_wait,
+            "messages": self.messages,
+            "turns": self.turns,
+            "merged": self.merged,
+            "capped": self.capped,
+            "pending": pending,
+        }
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join((text or "").lower().split()).rstrip("?!.,; ")
+
+
+def cache_key(kind: str, model: str, prompt, **params) -> str:
+    """Stable key for a completion from its kind, model, prompt and parameters"""
+    if isinstance(prompt, str):
+        prompt = normalize_prompt(prompt)
+    payload = json.dumps([kind, model, prompt, params], sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class CompletionCache:
+    """Interface for completion caches; also the no-op implementation"""
+
+    def __init__(self):
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def get_entry(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, expires_at) for a live entry"""
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value: str, ttl: float):
+        pass
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Get a value and count the hit or miss against the key's kind"""
+        value = self.get(key)
+        kind = key.split(":", 1)[0]
+        counter = self.hits if value is not None else self.misses
+        counter[kind] = counter.get(kind, 0) + 1
+        return value
+
+    def stats(self) -> Dict:
+        kinds = set(self.hits) | set(self.misses)
+        return {
+            kind: {
+                "hits": self.hits.get(kind, 0),
+                "misses": self.misses.get(kind, 0),
+            }
+            for kind in sorted(kinds)
+        }
+
+
+class MemoryCompletionCache(CompletionCache):
+    """In-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 5000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCompletionCache(CompletionCache):
+    """Completion cache persisted in its own SQLite file"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completion_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("DELETE FROM completion_cache WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+
+    def get_entry(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM completion_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completion_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._conn.commit()
+
+
+class TieredCompletionCache(CompletionCache):
+    """Memory LRU in front of a persistent cache; persistent hits are promoted"""
+
+    def __init__(self, memory: MemoryCompletionCache, persistent: CompletionCache):
+        super().__init__()
+        self.memory = memory
+        self.persistent = persistent
+
+    def get_entry(self, key: str) -> Optional[Tuple[str, float]]:
+        entry = self.memory.get_entry(key)
+        if entry is None:
+            entry = self.persistent.get_entry(key)
+            if entry is not None:
+                self.memory.set(key, entry[0], entry[1] - time.time())
+        return entry
+
+    def set(self, key: str, value: str, ttl: float):
+        self.memory.set(key, value, ttl)
+        self.persistent.set(key, value, ttl)
+
+
+def build_completion_cache() -> CompletionCache:
+    """Create the completion cache selected by CACHE_BACKEND"""
+    backend = config.CACHE_BACKEND
+    try:
+        if backend == "memory":
+            return MemoryCompletionCache(config.CACHE_MAX_ENTRIES)
+        if backend == "sqlite":
+            return SQLiteCompletionCache(config.CACHE_PATH)
+        if backend == "tiered":
+            return TieredCompletionCache(
+                MemoryCompletionCache(config.CACHE_MAX_ENTRIES),
+                SQLiteCompletionCache(config.CACHE_PATH)
+            )
+    except Exception as e:
+        logger.error(f"Failed to create {backend} completion cache: {e}")
+    return CompletionCache()
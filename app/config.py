@@ -5,10 +5,78 @@ load_dotenv()
 
 class Config:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+    AI_CONCURRENCY = int(os.getenv('AI_CONCURRENCY', 4))
+    AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', 15))
+    AI_STREAMING = os.getenv('AI_STREAMING', 'False').lower() == 'true'  # Send AI replies sentence by sentence as they stream
+    STREAM_CHUNK_CHARS = int(os.getenv('STREAM_CHUNK_CHARS', 160))  # Minimum size of streamed chunks after the first
+    COALESCE_WINDOW = float(os.getenv('COALESCE_WINDOW', 2.5))  # Seconds to wait for more messages before replying
+    COALESCE_MAX_WAIT = float(os.getenv('COALESCE_MAX_WAIT', 10))  # Longest a turn is held after its first message
+    SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', 20))  # Time pending replies get to go out on shutdown
+    HISTORY_MAX_MESSAGES = int(os.getenv('HISTORY_MAX_MESSAGES', 40))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1200))
+    HISTORY_SUMMARY = os.getenv('HISTORY_SUMMARY', 'False').lower() == 'true'
+    HISTORY_MAX_CONTACTS = int(os.getenv('HISTORY_MAX_CONTACTS', 1000))
+    SENTIMENT_ANALYSIS = os.getenv('SENTIMENT_ANALYSIS', 'False').lower() == 'true'
+    SENTIMENT_BATCH_SIZE = int(os.getenv('SENTIMENT_BATCH_SIZE', 50))
+    SENTIMENT_FLUSH_INTERVAL = float(os.getenv('SENTIMENT_FLUSH_INTERVAL', 10))
+    SENTIMENT_MAX_ATTEMPTS = int(os.getenv('SENTIMENT_MAX_ATTEMPTS', 3))
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'tiered')  # 'tiered', 'memory', 'sqlite' or 'none'
+    CACHE_PATH = os.getenv('CACHE_PATH', 'completion_cache.db')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 5000))
+    CACHE_TTL_REPLY = float(os.getenv('CACHE_TTL_REPLY', 3600))
+    CACHE_TTL_SCHEDULED = float(os.getenv('CACHE_TTL_SCHEDULED', 86400))
+    CACHE_TTL_SENTIMENT = float(os.getenv('CACHE_TTL_SENTIMENT', 604800))
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 8000))
-    DATABASE_URL = 'sqlite:///whatsapp_automation.db'
+    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///whatsapp_automation.db')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    MESSAGE_LOG_MAX_ROWS = int(os.getenv('MESSAGE_LOG_MAX_ROWS', 100))
+    MESSAGE_LOG_MAX_DELAY = float(os.getenv('MESSAGE_LOG_MAX_DELAY_MS', 200)) / 1000
+    DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', 5))  # Seconds SQLite waits on a locked database
+    SCHEDULER_TIMEZONE = os.getenv('SCHEDULER_TIMEZONE', 'UTC')
+    SCHEDULER_MISFIRE_GRACE = float(os.getenv('SCHEDULER_MISFIRE_GRACE', 86400))  # Seconds a missed run may still fire
+    SCHEDULER_PREFETCH = float(os.getenv('SCHEDULER_PREFETCH', 180))  # Seconds ahead of a deadline to personalise
+    SCHEDULER_PERSONALIZE_WORKERS = int(os.getenv('SCHEDULER_PERSONALIZE_WORKERS', 4))
+    # Relative share of the browser each outbound lane gets while all are busy
+    OUTBOUND_LANE_WEIGHTS = {
+        'interactive': float(os.getenv('OUTBOUND_WEIGHT_INTERACTIVE', 8)),
+        'manual': float(os.getenv('OUTBOUND_WEIGHT_MANUAL', 4)),
+        'scheduled': float(os.getenv('OUTBOUND_WEIGHT_SCHEDULED', 2)),
+        'bulk': float(os.getenv('OUTBOUND_WEIGHT_BULK', 1)),
+    }
+    OUTBOUND_AGING_SECONDS = float(os.getenv('OUTBOUND_AGING_SECONDS', 30))  # Wait that earns a lane its full aging credit
+    CAMPAIGN_RATE_PER_MINUTE = float(os.getenv('CAMPAIGN_RATE_PER_MINUTE', 20))
+    CAMPAIGN_BURST = int(os.getenv('CAMPAIGN_BURST', 5))
+    CAMPAIGN_BATCH_SIZE = int(os.getenv('CAMPAIGN_BATCH_SIZE', 25))
+    CAMPAIGN_PERSONALIZE_WORKERS = int(os.getenv('CAMPAIGN_PERSONALIZE_WORKERS', 4))
+    WHATSAPP_WEB_URL = os.getenv('WHATSAPP_WEB_URL', 'https://web.whatsapp.com')
+    MONITOR_MODE = os.getenv('MONITOR_MODE', 'observer')  # 'observer' or 'poll'
+    MONITOR_INTERVAL = float(os.getenv('MONITOR_INTERVAL', 0.5))
+    POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', 5))
+    TYPE_MODE = os.getenv('TYPE_MODE', 'insert')  # 'insert' (one script call) or 'keys' (send_keys per character)
+    SCRAPE_MODE = os.getenv('SCRAPE_MODE', 'script')  # 'script' (one round trip) or 'elements'
+    SCRAPE_MAX_BUBBLES = int(os.getenv('SCRAPE_MAX_BUBBLES', 20))
+    SWEEP_UNREAD = os.getenv('SWEEP_UNREAD', 'True').lower() == 'true'
+    SWEEP_INTERVAL = float(os.getenv('SWEEP_INTERVAL', 5))
+    SWEEP_VISIT_BUDGET = int(os.getenv('SWEEP_VISIT_BUDGET', 3))  # Chats opened per sweep
+    SWEEP_MAX_MESSAGES = int(os.getenv('SWEEP_MAX_MESSAGES', 20))  # Unread messages read per chat visit
+    SWEEP_AGE_WEIGHT = float(os.getenv('SWEEP_AGE_WEIGHT', 60))  # Seconds of waiting that rank like one unread message
+    SWEEP_RENDER_TIMEOUT = float(os.getenv('SWEEP_RENDER_TIMEOUT', 2))
+    SCRAPE_DATE_ORDER = os.getenv('SCRAPE_DATE_ORDER', 'dmy')  # Date order of the WhatsApp Web locale: 'dmy' or 'mdy'
+    HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', 2))
+    HEARTBEAT_TTL = float(os.getenv('HEARTBEAT_TTL', 10))
+    PAGE_LOAD_TIMEOUT = float(os.getenv('PAGE_LOAD_TIMEOUT', 30))
+    SEEN_MESSAGES_PATH = os.getenv('SEEN_MESSAGES_PATH', 'seen_messages.json')
+    CHROME_PROFILE_DIR = os.getenv('CHROME_PROFILE_DIR', '/data')  # Profile of the default account
+    SESSION_PROFILE_ROOT = os.getenv('SESSION_PROFILE_ROOT', 'profiles')  # Other accounts get a subdirectory here
+    DEFAULT_ACCOUNT = os.getenv('DEFAULT_ACCOUNT', 'default')
+    MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', 4))
+    CHAT_CACHE_SIZE = int(os.getenv('CHAT_CACHE_SIZE', 32))
+    SEEN_MESSAGES_CAPACITY = int(os.getenv('SEEN_MESSAGES_CAPACITY', 10000))
 
 config = Config()
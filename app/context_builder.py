@@ -0,0 +1,134 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Tokens the chat format adds around every message, and once per reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """Load the tiktoken encoder once; None if tiktoken is unavailable"""
+    global _encoder, _encoder_loaded
+    if _encoder_loaded:
+        return _encoder
+    with _encoder_lock:
+        if not _encoder_loaded:
+            try:
+                import tiktoken
+                _encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.info(f"tiktoken unavailable ({e}); estimating token counts")
+                _encoder = None
+            _encoder_loaded = True
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """Token count for a piece of text, estimated at ~4 characters per token without tiktoken"""
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text or ""))
+    return len(text or "") // 4 + 1
+
+
+def message_tokens(entry: Dict) -> int:
+    """Token cost of a history entry, cached on the entry the first time it is counted"""
+    tokens = entry.get("tokens")
+    if tokens is None:
+        tokens = entry["tokens"] = count_tokens(entry["content"]) + MESSAGE_OVERHEAD_TOKENS
+    return tokens
+
+
+@lru_cache(maxsize=256)
+def system_message(base_prompt: str, context: Optional[str]) -> Tuple[str, int]:
+    """Compose the system prompt for a rule context and count it once"""
+    prompt = base_prompt
+    if context:
+        prompt += f"\nAdditional context: {context}"
+    return prompt, count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    """Chat completion messages packed to a token budget"""
+
+    def __init__(self, messages: List[Dict], input_tokens: int, dropped: List[Dict]):
+        self.messages = messages
+        self.input_tokens = input_tokens
+        self.dropped = dropped
+
+
+class ContextBuilder:
+    """Packs the newest conversation turns that fit a token budget"""
+
+    def __init__(self, base_prompt: str, budget: int):
+        self.base_prompt = base_prompt
+        self.budget = budget
+
+    def build(self, history: List[Dict], context: str = None, summary: str = None) -> ContextWindow:
+        system_prompt, tokens = system_message(self.base_prompt, context)
+        tokens += REPLY_PRIMING_TOKENS
+
+        summary_message = None
+        summary_tokens = 0
+        if summary:
+            summary_message = {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+            summary_tokens = count_tokens(summary_message["content"]) + MESSAGE_OVERHEAD_TOKENS
+            tokens += summary_tokens
+
+        # Walk back from the newest turn; the newest is always kept
+        included = []
+        for index in range(len(history) - 1, -1, -1):
+            cost = message_tokens(history[index])
+            if included and tokens + cost > self.budget:
+                break
+            tokens += cost
+            included.append(history[index])
+        included.reverse()
+        dropped = history[:len(history) - len(included)]
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary_message and dropped:
+            messages.append(summary_message)
+        elif summary_message:
+            # Nothing older than the window, so the summary would only repeat it
+            tokens -= summary_tokens
+        messages.extend({"role": e["role"], "content": e["content"]} for e in included)
+        return ContextWindow(messages, tokens, dropped)
+
+
+class TokenUsage:
+    """Running totals of prompt tokens sent per request"""
+
+    def __init__(self):
+        self.requests = 0
+        self.estimated_input_tokens = 0
+        self.prompt_tokens = 0
+        self.last_prompt_tokens = None
+        self._lock = threading.Lock()
+
+    def record(self, estimated: int, usage=None):
+        with self._lock:
+            self.requests += 1
+            self.estimated_input_tokens += estimated
+            prompt_tokens = getattr(usage, "prompt_tokens", None)
+            if prompt_tokens is not None:
+                self.prompt_tokens += prompt_tokens
+                self.last_prompt_tokens = prompt_tokens
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "avg_prompt_tokens": round(self.prompt_tokens / self.requests, 1) if self.requests else None,
+                "last_prompt_tokens": self.last_prompt_tokens,
+                "estimated_input_tokens": self.estimated_input_tokens,
+            }
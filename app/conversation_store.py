@@ -0,0 +1,190 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+
+from sqlalchemy import or_
+
+from app.config import config
+from app.context_builder import message_tokens
+
+logger = logging.getLogger(__name__)
+
+# History is kept per (account, contact): two accounts can each have a chat with the same title
+Conversation = Tuple[str, str]
+
+
+def conversation_key(account: Optional[str], contact: str) -> Conversation:
+    """The history key for a contact's chat on an account (the default one if not given)"""
+    return (account or config.DEFAULT_ACCOUNT, contact)
+
+
+class ConversationStore(ABC):
+    """Interface for conversation history, keyed by (account, contact)"""
+
+    @abstractmethod
+    def get(self, conversation: Conversation) -> List[Dict]:
+        """Return the conversation's recent turns, oldest first"""
+
+    @abstractmethod
+    def append(self, conversation: Conversation, role: str, content: str):
+        """Add a turn to the conversation's history"""
+
+    def get_summary(self, conversation: Conversation) -> Optional[str]:
+        """Rolling summary of turns older than the history window"""
+        return None
+
+    def set_summary(self, conversation: Conversation, summary: str):
+        pass
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Bounded history: a deque per conversation and an LRU cap on how many are kept"""
+
+    def __init__(self, max_messages: int = 10, max_contacts: int = 1000):
+        self.max_messages = max_messages
+        self.max_contacts = max_contacts
+        self._histories = OrderedDict()
+        self._summaries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._histories)
+
+    def get(self, conversation: Conversation) -> List[Dict]:
+        with self._locked_history(conversation) as history:
+            return list(history)
+
+    def append(self, conversation: Conversation, role: str, content: str):
+        with self._locked_history(conversation) as history:
+            history.append(self._entry(role, content))
+
+    def get_summary(self, conversation: Conversation) -> Optional[str]:
+        return self._summaries.get(conversation)
+
+    def set_summary(self, conversation: Conversation, summary: str):
+        with self._lock:
+            if conversation in self._histories:
+                self._summaries[conversation] = summary
+
+    def _entry(self, role: str, content: str) -> Dict:
+        entry = {"role": role, "content": content}
+        message_tokens(entry)  # Count once, when the turn is added
+        return entry
+
+    @contextmanager
+    def _locked_history(self, conversation: Conversation):
+        """Hold the lock with the conversation's history in memory.
+
+        A cold conversation is loaded before the lock is taken, so one slow load
+        does not hold up every other conversation.
+        """
+        loaded = None
+        while True:
+            self._lock.acquire()
+            if loaded is not None or conversation in self._histories:
+                break
+            self._lock.release()
+            loaded = self._load(conversation)
+        try:
+            yield self._history(conversation, loaded)
+        finally:
+            self._lock.release()
+
+    def _history(self, conversation: Conversation, loaded: List[Dict] = None) -> deque:
+        """The conversation's history, created from loaded if it is not in memory; the caller holds the lock"""
+        history = self._histories.get(conversation)
+        if history is None:
+            history = deque(loaded or [], maxlen=self.max_messages)
+            self._histories[conversation] = history
+            while len(self._histories) > self.max_contacts:
+                evicted, _ = self._histories.popitem(last=False)
+                self._summaries.pop(evicted, None)
+                self._evicted(evicted)
+        else:
+            self._histories.move_to_end(conversation)
+        return history
+
+    def _load(self, conversation: Conversation) -> List[Dict]:
+        """Initial history for a conversation that is not in memory"""
+        return []
+
+    def _evicted(self, conversation: Conversation):
+        """Called when a conversation is dropped from memory"""
+
+
+class SQLConversationStore(InMemoryConversationStore):
+    """In-memory history that lazily rehydrates cold contacts from the messages table"""
+
+    def __init__(self, session_factory, max_messages: int = 10, max_contacts: int = 1000):
+        super().__init__(max_messages, max_contacts)
+        self.session_factory = session_factory
+        self._rehydrated = set()
+
+    def append(self, conversation: Conversation, role: str, content: str):
+        with self._locked_history(conversation) as history:
+            if conversation in self._rehydrated:
+                # The inbound row being answered is usually already in the table
+                self._rehydrated.discard(conversation)
+                if self._matches_tail(history, role, content):
+                    return
+            history.append(self._entry(role, content))
+
+    @staticmethod
+    def _matches_tail(history: deque, role: str, content: str) -> bool:
+        """Whether content is the newest run of role turns, joined the way a coalesced turn is"""
+        tail = []
+        for entry in reversed(history):
+            if entry["role"] != role:
+                break
+            tail.insert(0, entry["content"])
+            if "\n".join(tail) == content:
+                return True
+        return False
+
+    def _evicted(self, conversation: Conversation):
+        self._rehydrated.discard(conversation)
+
+    def _load(self, conversation: Conversation) -> List[Dict]:
+        from app.database import Message
+
+        account, contact = conversation
+        db = self.session_factory()
+        try:
+            account_filter = Message.account == account
+            if account == config.DEFAULT_ACCOUNT:
+                # Rows logged before accounts were recorded belong to the default account
+                account_filter = or_(account_filter, Message.account.is_(None))
+            rows = db.query(Message.message, Message.direction, Message.is_automated).filter(
+                Message.contact == contact, account_filter
+            ).order_by(Message.id.desc()).limit(self.max_messages).all()
+        except Exception as e:
+            logger.error(f"Error loading conversation history for {contact} on {account}: {e}")
+            rows = []
+        finally:
+            db.close()
+
+        if rows:
+            self._rehydrated.add(conversation)
+        return [
+            {"role": self._role(direction, is_automated), "content": text}
+            for text, direction, is_automated in reversed(rows)
+        ]
+
+    @staticmethod
+    def _role(direction: Optional[str], is_automated: bool) -> str:
+        """Chat role of a logged message; rows from before direction was recorded fall back to is_automated"""
+        if direction:
+            return "assistant" if direction == "outbound" else "user"
+        return "assistant" if is_automated else "user"
+
+
+def build_conversation_store() -> ConversationStore:
+    """Create the default store backed by the application database"""
+    from app.database import SessionLocal
+
+    return SQLConversationStore(
+        SessionLocal, config.HISTORY_MAX_MESSAGES, config.HISTORY_MAX_CONTACTS
+    )
@@ -0,0 +1,152 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import re
+
+MONTH_NAMES = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+# The phrases the dashboard has always accepted, e.g. "daily at 09:00"
+DAILY_RE = re.compile(r"^daily\s+at\s+(\d{1,2}):(\d{2})$")
+WEEKLY_RE = re.compile(r"^weekly(?:\s+on\s+([a-z]+))?\s+at\s+(\d{1,2}):(\d{2})$")
+
+# Far enough to find Feb 29 on a given weekday
+MAX_SEARCH_YEARS = 28
+
+
+def _parse_field(field: str, low: int, high: int, names: List[str] = None) -> Set[int]:
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid step in cron field '{field}'")
+        if part == "*":
+            start, end = low, high
+        else:
+            bounds = [_parse_value(value, names) for value in part.split("-", 1)]
+            start = bounds[0]
+            end = bounds[1] if len(bounds) == 2 else (high if step > 1 else start)
+        if not (low <= start <= high and low <= end <= high) or start > end:
+            raise ValueError(f"Cron field '{field}' is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _parse_value(value: str, names: List[str] = None) -> int:
+    value = value.strip().lower()
+    if names and value[:3] in names:
+        return names.index(value[:3]) + (1 if names is MONTH_NAMES else 0)
+    return int(value)
+
+
+def get_timezone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo for an IANA name; ValueError if it is unknown"""
+    try:
+        return ZoneInfo(name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{name}'")
+
+
+class CronSchedule:
+    """A five-field cron expression (minute hour day month weekday) in a timezone"""
+
+    def __init__(self, expression: str, tz: str = "UTC"):
+        self.expression = expression
+        self.tz = get_timezone(tz)
+        fields = ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' needs 5 fields")
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12, MONTH_NAMES)
+        # 7 is also accepted for Sunday
+        self.weekdays = {day % 7 for day in _parse_field(fields[4], 0, 7, DAY_NAMES)}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        self._sorted_minutes = sorted(self.minutes)
+        self._sorted_hours = sorted(self.hours)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        # Cron runs when either day field matches if both are restricted
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """First fire time strictly after a naive UTC time, as naive UTC"""
+        local = after.replace(tzinfo=timezone.utc).astimezone(self.tz).replace(tzinfo=None)
+        moment = local.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment.year + MAX_SEARCH_YEARS
+
+        while moment.year <= limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if moment.hour not in self.hours:
+                # Jump straight to the next allowed hour, or the next day
+                i = bisect_left(self._sorted_hours, moment.hour)
+                if i < len(self._sorted_hours):
+                    moment = moment.replace(hour=self._sorted_hours[i], minute=0)
+                else:
+                    moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if moment.minute not in self.minutes:
+                i = bisect_left(self._sorted_minutes, moment.minute)
+                if i < len(self._sorted_minutes):
+                    moment = moment.replace(minute=self._sorted_minutes[i])
+                else:
+                    moment = moment.replace(minute=0) + timedelta(hours=1)
+                continue
+
+            fire = moment.replace(tzinfo=self.tz).astimezone(timezone.utc).replace(tzinfo=None)
+            if fire > after:
+                return fire
+            # A repeated wall-clock time after a DST change; keep looking
+            moment += timedelta(minutes=1)
+
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+    def __repr__(self):
+        return f"CronSchedule({self.expression!r}, {self.tz.key!r})"
+
+
+def to_cron(schedule_time: str) -> str:
+    """Cron expression for a schedule string, translating the legacy phrases"""
+    text = " ".join(schedule_time.strip().lower().split())
+    match = DAILY_RE.match(text)
+    if match:
+        return f"{int(match.group(2))} {int(match.group(1))} * * *"
+    match = WEEKLY_RE.match(text)
+    if match:
+        day = match.group(1) or "mon"
+        if day[:3] not in DAY_NAMES:
+            raise ValueError(f"Unknown weekday '{day}'")
+        return f"{int(match.group(3))} {int(match.group(2))} * * {DAY_NAMES.index(day[:3])}"
+    if text in ("daily", "weekly", "hourly", "monthly", "yearly"):
+        return ALIASES[f"@{text}"]
+    return schedule_time.strip()
+
+
+def parse_schedule(schedule_time: str, tz: str = "UTC") -> CronSchedule:
+    """Parse a cron expression, @alias or "daily/weekly at HH:MM" phrase"""
+    return CronSchedule(to_cron(schedule_time), tz)
@@ -1,17 +1,113 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import create_engine, event, inspect, text, Column, ForeignKey, Index, Integer, String, DateTime, Text, Boolean, Float
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import NoSuchModuleError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from datetime import datetime
+import asyncio
+import logging
 from app.config import config
 
-engine = create_engine(config.DATABASE_URL)
+logger = logging.getLogger(__name__)
+
+# Async drivers used for the same database as the sync engine
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def _async_url(url):
+    """The DATABASE_URL with its driver swapped for the async equivalent, or None if there is none"""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return None
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+class ThreadedSession:
+    """Async-style wrapper that runs a sync Session's queries in a worker thread.
+
+    Async routes use it when the database has no async driver, so they keep
+    working on any backend SQLAlchemy supports, just without a native
+    async connection.
+    """
+
+    AWAITABLE = {"execute", "scalars", "scalar", "get", "flush", "commit", "rollback", "refresh", "close"}
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        attribute = getattr(self._session, name)
+        if name not in self.AWAITABLE:
+            return attribute
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attribute, *args, **kwargs)
+        return call
+
+def _engine_options(url, is_async: bool = False) -> dict:
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {"connect_args": {"check_same_thread": False}}
+    options = {
+        # Some drivers (aiosqlite) default to NullPool, which reconnects per session
+        "poolclass": AsyncAdaptedQueuePool if is_async else QueuePool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+    if url.get_backend_name() == "sqlite":
+        # Sessions are created on one thread and may be closed on another
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options["pool_recycle"] = 1800
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout waits out lock contention"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT * 1000)}")
+    cursor.close()
+
+database_url = make_url(config.DATABASE_URL)
+engine = create_engine(database_url, **_engine_options(database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _create_async_engine(url):
+    """Async engine for the database, or None when no async driver is available for it"""
+    async_url = _async_url(url)
+    if async_url is None:
+        logger.warning(f"No async driver for {url.get_backend_name()} databases; async routes run queries in threads")
+        return None
+    try:
+        # The driver (e.g. asyncpg) is imported here, and it is not always installed
+        return create_async_engine(async_url, **_engine_options(async_url, is_async=True))
+    except (ImportError, NoSuchModuleError) as e:
+        logger.warning(f"Async driver {async_url.drivername} is unavailable ({e}); async routes run queries in threads")
+        return None
+
+async_engine = _create_async_engine(database_url)
+if async_engine is not None:
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+else:
+    AsyncSessionLocal = None
+
+if database_url.get_backend_name() == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 Base = declarative_base()
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
+    username = Column(String, unique=True, index=True)  # WhatsApp account name in the session pool
+    profile_dir = Column(String)  # Chrome profile holding the account's WhatsApp Web login
     is_active = Column(Boolean, default=True)
     whatsapp_connected = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -19,18 +115,30 @@ class User(Base):
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True, index=True)
+    external_id = Column(String, unique=True, index=True)  # WhatsApp message ID
+    account = Column(String)  # Session pool account that received or sent it
     contact = Column(String, index=True)
     message = Column(Text)
     response = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     is_automated = Column(Boolean, default=False)
+    direction = Column(String)  # "inbound" from the contact or "outbound" to them
+    sentiment = Column(String)  # Filled in later by the sentiment batcher
+    sentiment_confidence = Column(Float)
+    
+    # Per-contact history, newest first, without sorting the table
+    __table_args__ = (Index("ix_messages_contact_timestamp", "contact", "timestamp"),)
 
 class ScheduledMessage(Base):
     __tablename__ = "scheduled_messages"
     id = Column(Integer, primary_key=True, index=True)
     contact = Column(String)
     message = Column(Text)
-    scheduled_time = Column(String)  # Cron-like format or time
+    scheduled_time = Column(String)  # Cron expression or "daily at HH:MM"
+    timezone = Column(String, default="UTC")  # IANA zone the schedule is evaluated in
+    next_fire_at = Column(DateTime, index=True)  # UTC
+    last_planned_at = Column(DateTime)  # UTC time the last run was due
+    last_fired_at = Column(DateTime)  # UTC time the last run was released to send
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -40,14 +148,73 @@ class AutomationRule(Base):
     trigger_keyword = Column(String)
     response_template = Column(Text)
     use_ai = Column(Boolean, default=True)
+    cache_responses = Column(Boolean, default=False)  # Share cached FAQ replies across contacts
+    debounce_seconds = Column(Float)  # Coalescing window for messages matching this rule; None uses the default
     is_active = Column(Boolean, default=True)
 
+class Campaign(Base):
+    __tablename__ = "campaigns"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    template = Column(Text)  # {column} placeholders are filled from each recipient's CSV row
+    personalize = Column(Boolean, default=False)  # Rewrite each message with AI before sending
+    rate_per_minute = Column(Float)
+    status = Column(String, default="draft")  # draft, running, paused, completed, cancelled
+    total = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+
+class CampaignRecipient(Base):
+    __tablename__ = "campaign_recipients"
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    contact = Column(String)
+    variables = Column(Text)  # JSON of the recipient's CSV row
+    message = Column(Text)  # Rendered (and personalised) text, saved before sending
+    status = Column(String, default="pending")  # pending, prepared, sending, sent, failed
+    error = Column(Text)
+    sent_at = Column(DateTime)
+    
+    # The send cursor walks one campaign's unsent recipients in id order
+    __table_args__ = (Index("ix_campaign_recipients_campaign_status", "campaign_id", "status"),)
+
+def _migrate_schema():
+    """Add columns and indexes that create_all does not add to existing tables"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 Base.metadata.create_all(bind=engine)
+_migrate_schema()
 
 def get_db():
+    """Sync session, for worker threads and sync routes"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_db():
+    """Async session, for async routes so queries do not block the event loop"""
+    if AsyncSessionLocal is None:
+        db = ThreadedSession(SessionLocal(autoflush=False, expire_on_commit=False))
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
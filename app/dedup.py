@@ -0,0 +1,81 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def message_id(raw_id: str = None, sender: str = "", text: str = "", sent_at: str = "") -> str:
+    """Return a stable message ID, preferring WhatsApp's own DOM data-id"""
+    if raw_id:
+        return raw_id
+    digest = hashlib.sha1(f"{sender}\x1f{sent_at}\x1f{text}".encode("utf-8")).hexdigest()
+    return f"hash_{digest}"
+
+
+class SeenMessageCache:
+    """Bounded LRU of dispatched message IDs, persisted to a JSON file"""
+
+    def __init__(self, path: str = None, capacity: int = 10000, save_every: int = 50):
+        self.path = path
+        self.capacity = capacity
+        self.save_every = save_every
+        self._ids = OrderedDict()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, message_id: str):
+        return message_id in self._ids
+
+    def add(self, message_id: str) -> bool:
+        """Record a message ID; returns False if it was already seen"""
+        with self._lock:
+            if message_id in self._ids:
+                self._ids.move_to_end(message_id)
+                return False
+
+            self._ids[message_id] = None
+            if len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_every
+
+        if should_save:
+            self.save()
+        return True
+
+    def load(self):
+        """Load previously seen IDs from disk"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            with self._lock:
+                self._ids = OrderedDict((i, None) for i in ids[-self.capacity:])
+            logger.info(f"Loaded {len(self._ids)} seen message IDs")
+        except Exception as e:
+            logger.error(f"Error loading seen message IDs: {e}")
+
+    def save(self):
+        """Write seen IDs to disk atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            ids = list(self._ids)
+            self._unsaved = 0
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(ids, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving seen message IDs: {e}")
@@ -0,0 +1,97 @@
+from typing import AsyncIterator, Dict
+import asyncio
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One browser's queue of pending events"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def deliver(self, event: Dict):
+        """Runs on the subscriber's loop; drops the oldest event when the browser falls behind"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """In-process pub/sub feeding the live dashboard streams.
+
+    publish() may be called from any thread. It only hands the event to
+    each subscriber's event loop, so publishers never wait on browsers and
+    the cost of an open dashboard is one queue, not a query or a browser
+    probe per refresh. The latest event of each sticky type is replayed to
+    new subscribers so they start from the current state.
+    """
+
+    STICKY_TYPES = ("connection", "automation")
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._latest: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event_type: str, data: Dict):
+        """Send an event to every connected subscriber"""
+        event = {"type": event_type, "data": data, "time": time.time()}
+        with self._lock:
+            self.published += 1
+            if event_type in self.STICKY_TYPES:
+                self._latest[event_type] = event
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self._unsubscribe(subscription)
+
+    def subscribe(self) -> Subscription:
+        """Register a subscriber on the running event loop"""
+        subscription = Subscription(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscription)
+            latest = list(self._latest.values())
+        for event in latest:
+            subscription.deliver(event)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    async def stream(self, keepalive: float = 15) -> AsyncIterator[str]:
+        """Server-sent events for one client until it disconnects"""
+        subscription = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        finally:
+            self._unsubscribe(subscription)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": sum(s.dropped for s in self._subscribers),
+            }
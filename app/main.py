@@ -1,17 +1,30 @@
-from fastapi import FastAPI, Request, Depends, Form, HTTPException
+from fastapi import FastAPI, Request, Depends, File, Form, HTTPException, Query, UploadFile
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from sqlalchemy.orm import Session
-import threading
-import time
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import csv
 import logging
 
 from app.config import config
-from app.database import get_db, User, Message, ScheduledMessage, AutomationRule
-from app.whatsapp_client import WhatsAppClient
+from app.database import (
+    get_async_db, async_engine, SessionLocal, Message, ScheduledMessage, AutomationRule,
+    Campaign, CampaignRecipient
+)
 from app.openai_handler import OpenAIHandler
 from app.scheduler import MessageScheduler
+from app.rule_matcher import RuleIndex
+from app.reply_pipeline import ReplyPipeline
+from app.sentiment import SentimentBatcher
+from app.message_log import MessageLog, LoggedMessage
+from app.events import EventBus
+from app.campaigns import CampaignRunner, campaign_report, create_campaign_rows, parse_contacts_csv
+from app.sessions import SessionPool
+from app.coalescer import MessageCoalescer, Turn
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,9 +36,11 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 # Initialize components
-whatsapp_client = None
 openai_handler = OpenAIHandler()
 scheduler = None
+campaign_runner = None
+rule_index = RuleIndex()
+event_bus = EventBus()
 
 # Global state
 automation_active = False
@@ -38,66 +53,153 @@ def message_handler(message_data):
     if not automation_active:
         return
     
-    db = next(get_db())
     try:
         sender = message_data['sender']
         message_text = message_data['message']
+        account = message_data.get('account')
         
         logger.info(f"Processing message from {sender}: {message_text}")
         
-        # Save incoming message
-        new_message = Message(
+        if message_log.is_duplicate(message_data.get('id')):
+            logger.info(f"Skipping already processed message {message_data.get('id')}")
+            return
+        
+        # Buffer the incoming message; it is written with the next group commit
+        inbound = message_log.add(
+            external_id=message_data.get('id'),
+            account=account,
             contact=sender,
             message=message_text,
+            direction="inbound",
             is_automated=False
         )
-        db.add(new_message)
-        db.commit()
-        
-        # Check automation rules
-        rules = db.query(AutomationRule).filter(AutomationRule.is_active == True).all()
-        
-        should_respond = False
-        response_template = None
-        use_ai = True
         
-        for rule in rules:
-            if rule.trigger_keyword.lower() in message_text.lower():
-                should_respond = True
-                response_template = rule.response_template
-                use_ai = rule.use_ai
-                break
+        if config.SENTIMENT_ANALYSIS:
+            # Sentiment is stored by row id, so queue it once the row is written
+            def queue_sentiment(future):
+                if future.result():
+                    sentiment_batcher.submit(future.result(), message_text)
+            inbound.future.add_done_callback(queue_sentiment)
         
-        # Generate and send response
-        if should_respond:
-            if use_ai:
-                ai_response = openai_handler.generate_response(
-                    message_text, sender, response_template
-                )
-            else:
-                ai_response = response_template
-            
-            # Send response
-            if whatsapp_client.send_message(sender, ai_response):
-                # Save response
-                new_message.response = ai_response
-                db.commit()
-                
-                # Save as separate message record
-                response_msg = Message(
-                    contact=sender,
-                    message=ai_response,
-                    is_automated=True
-                )
-                db.add(response_msg)
-                db.commit()
-                
-                logger.info(f"Sent automated response to {sender}")
+        # Hold the message briefly so a burst from this contact gets one reply;
+        # a matching rule may set its own window (0 answers straight away)
+        rule = rule_index.match(message_text)
+        window = rule.debounce_seconds if rule else None
+        coalescer.add(
+            (account, sender),
+            {"message": message_text, "inbound": inbound, "sender": sender, "account": account},
+            window=window
+        )
         
     except Exception as e:
         logger.error(f"Error handling message: {e}")
-    finally:
-        db.close()
+
+def handle_turn(turn: Turn):
+    """Match rules against a contact's coalesced messages and reply once"""
+    if not automation_active:
+        return
+    
+    message_text = turn.text
+    sender = turn.last["sender"]
+    account = turn.last["account"]
+    # The reply is recorded on the newest message of the turn
+    inbound = turn.last["inbound"]
+    
+    # Check automation rules against the in-memory index
+    rule = rule_index.match(message_text)
+    
+    # Generate the reply off this thread, or send the static template directly
+    if rule:
+        if rule.use_ai:
+            reply_pipeline.submit(
+                sender, message_text, rule.response_template,
+                {"inbound": inbound, "use_cache": rule.cache_responses},
+                account=account
+            )
+        else:
+            deliver_reply(sender, rule.response_template, inbound, account)
+
+def deliver_reply(contact: str, reply: str, inbound: LoggedMessage = None, account: str = None):
+    """Queue an automated reply on the account it answers and record it once it has been sent"""
+    if not reply:
+        return
+    
+    session = session_pool.route(account)
+    if not session or not session.outbound_queue:
+        logger.error(f"Cannot reply to {contact}: account {account or session_pool.default_account} is not connected")
+        return
+    
+    def on_sent(future):
+        if not future.result():
+            logger.error(f"Failed to send automated response to {contact}")
+            return
+        
+        # Save response on the inbound message, and as a separate message record
+        if inbound:
+            message_log.update(inbound, response=reply)
+        message_log.add(
+            account=account,
+            contact=contact,
+            message=reply,
+            direction="outbound",
+            is_automated=True
+        )
+        logger.info(f"Sent automated response to {contact}")
+    
+    session.outbound_queue.submit(contact, reply, "interactive").future.add_done_callback(on_sent)
+
+def on_ai_chunk(request, chunk: str):
+    """Send each part of a streamed AI reply as soon as it has been generated"""
+    deliver_reply(request.contact, chunk, None, request.account)
+
+def on_ai_reply(request, reply: str, used_ai: bool):
+    """Deliver a reply produced by the AI pipeline"""
+    inbound = request.context.get("inbound")
+    if request.chunks:
+        # Streamed replies were sent chunk by chunk; record the whole reply on the message
+        if inbound:
+            message_log.update(inbound, response=reply)
+        return
+    deliver_reply(request.contact, reply, inbound, request.account)
+
+def publish_flushed(inserted, updated):
+    """Push newly stored messages and response updates to live dashboards"""
+    for row in inserted:
+        event_bus.publish("message", {
+            "id": row["id"],
+            "account": row.get("account"),
+            "contact": row.get("contact"),
+            "message": row.get("message"),
+            "response": row.get("response"),
+            "timestamp": row["timestamp"].isoformat(),
+            "is_automated": bool(row.get("is_automated"))
+        })
+    for row_id, fields in updated.items():
+        if "response" in fields:
+            event_bus.publish("message_update", {"id": row_id, "response": fields["response"]})
+
+def publish_send(job):
+    """Push the outcome of a queued send to live dashboards"""
+    event_bus.publish("send", job.to_dict())
+
+def publish_campaign(report):
+    """Push campaign progress to live dashboards"""
+    event_bus.publish("campaign", report)
+
+def publish_connection(account, status):
+    """Push WhatsApp connection state changes to live dashboards and the setup page"""
+    event_bus.publish("connection", dict(status, account=account))
+
+def default_client():
+    """Browser client of the default account, if one has been started"""
+    session = session_pool.get()
+    return session.client if session else None
+
+message_log = MessageLog(SessionLocal, on_flush=publish_flushed)
+reply_pipeline = ReplyPipeline(openai_handler, on_ai_reply, on_chunk=on_ai_chunk)
+sentiment_batcher = SentimentBatcher(openai_handler, SessionLocal)
+session_pool = SessionPool(SessionLocal, on_state_change=publish_connection)
+coalescer = MessageCoalescer(handle_turn)
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
@@ -114,24 +216,22 @@ async def setup_page(request: Request):
     """Setup page for QR code scanning"""
     return templates.TemplateResponse("setup.html", {
         "request": request,
-        "whatsapp_connected": whatsapp_client.is_connected if whatsapp_client else False
+        "whatsapp_connected": session_pool.route() is not None
     })
 
 @app.post("/initialize-whatsapp")
-async def initialize_whatsapp():
-    """Initialize WhatsApp client and open web interface"""
-    global whatsapp_client, scheduler
+async def initialize_whatsapp(account: Optional[str] = None):
+    """Initialize an account's WhatsApp session and open web interface"""
+    try:
+        session = session_pool.session(account)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        logger.info("Initializing WhatsApp client...")
+        logger.info(f"Initializing WhatsApp client for account {session.account}...")
         
-        if whatsapp_client:
-            whatsapp_client.close()
-        
-        whatsapp_client = WhatsAppClient()
-        
-        # Open WhatsApp Web
-        if whatsapp_client.open_whatsapp_web():
+        # Open WhatsApp Web in a fresh browser on the account's own profile
+        if await asyncio.to_thread(session.open):
             return {"success": True, "message": "WhatsApp Web opened. Please scan the QR code."}
         else:
             return {"success": False, "message": "Failed to open WhatsApp Web"}
@@ -141,26 +241,37 @@ async def initialize_whatsapp():
         return {"success": False, "message": f"Error: {e}"}
 
 @app.post("/check-qr-status")
-async def check_qr_status():
-    """Check if QR code has been scanned"""
-    global whatsapp_client, scheduler, whatsapp_setup_complete
+async def check_qr_status(account: Optional[str] = None):
+    """Check if an account's QR code has been scanned"""
+    global scheduler, campaign_runner, whatsapp_setup_complete
     
-    if not whatsapp_client:
+    session = session_pool.get(account)
+    if not session or not session.client:
         return {"connected": False, "message": "WhatsApp client not initialized"}
     
     try:
-        # Check connection status
-        if whatsapp_client.check_connection():
-            if not whatsapp_setup_complete:
+        # Read the heartbeat-maintained state instead of probing the browser
+        if session.is_connected:
+            # Start the account's send worker, which owns its browser, and its inbound monitor
+            session.start_services(message_handler, publish_send)
+            
+            if session.account == session_pool.default_account and not whatsapp_setup_complete:
                 # Initialize scheduler
-                scheduler = MessageScheduler(whatsapp_client, openai_handler)
+                scheduler = MessageScheduler(session.client, openai_handler, session.outbound_queue)
                 scheduler.start_scheduler()
                 
-                # Start message monitoring
-                whatsapp_client.start_message_monitoring(message_handler)
+                # Broadcast campaigns share the send queue; pick up any interrupted ones
+                campaign_runner = CampaignRunner(session.outbound_queue, openai_handler, SessionLocal, publish_campaign)
+                campaign_runner.resume_running()
                 
                 whatsapp_setup_complete = True
                 logger.info("WhatsApp setup completed successfully!")
+            elif session.account == session_pool.default_account and scheduler.outbound_queue is not session.outbound_queue:
+                # The default account was re-initialised with a new browser and send queue
+                scheduler.whatsapp_client = session.client
+                scheduler.outbound_queue = session.outbound_queue
+                campaign_runner.outbound_queue = session.outbound_queue
+                logger.info("Scheduler and campaigns moved to the new WhatsApp session")
             
             return {"connected": True, "message": "WhatsApp connected successfully!"}
         else:
@@ -171,23 +282,31 @@ async def check_qr_status():
         return {"connected": False, "message": f"Error: {e}"}
 
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
+async def dashboard(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Main dashboard page"""
     global whatsapp_setup_complete
     
     if not whatsapp_setup_complete:
         return RedirectResponse(url="/setup", status_code=302)
     
-    messages = db.query(Message).order_by(Message.timestamp.desc()).limit(10).all()
-    scheduled_messages = db.query(ScheduledMessage).filter(ScheduledMessage.is_active == True).all()
-    automation_rules = db.query(AutomationRule).filter(AutomationRule.is_active == True).all()
+    # Write out buffered messages so the page shows everything handled so far
+    await asyncio.to_thread(message_log.flush)
+    messages = (await db.scalars(
+        select(Message).order_by(Message.timestamp.desc(), Message.id.desc()).limit(10)
+    )).all()
+    scheduled_messages = (await db.scalars(
+        select(ScheduledMessage).where(ScheduledMessage.is_active == True)
+    )).all()
+    automation_rules = (await db.scalars(
+        select(AutomationRule).where(AutomationRule.is_active == True)
+    )).all()
     
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "messages": messages,
         "scheduled_messages": scheduled_messages,
         "automation_rules": automation_rules,
-        "whatsapp_connected": whatsapp_client.is_connected if whatsapp_client else False,
+        "whatsapp_connected": session_pool.route() is not None,
         "automation_active": automation_active
     })
 
@@ -196,11 +315,12 @@ async def toggle_automation():
     """Toggle automation on/off"""
     global automation_active
     
-    if not whatsapp_setup_complete or not whatsapp_client or not whatsapp_client.is_connected:
+    if not whatsapp_setup_complete or not session_pool.route():
         raise HTTPException(status_code=400, detail="WhatsApp not connected")
     
     automation_active = not automation_active
     logger.info(f"Automation {'activated' if automation_active else 'deactivated'}")
+    event_bus.publish("automation", {"active": automation_active})
     
     return {"automation_active": automation_active}
 
@@ -208,27 +328,39 @@ async def toggle_automation():
 async def send_message(
     contact: str = Form(...),
     message: str = Form(...),
-    db: Session = Depends(get_db)
+    wait: bool = Form(True),
+    account: str = Form(None)
 ):
-    """Send a manual message"""
-    if not whatsapp_client or not whatsapp_client.is_connected:
+    """Send a manual message from an account (the default one if not given)"""
+    session = session_pool.route(account)
+    if not session or not session.outbound_queue:
         raise HTTPException(status_code=400, detail="WhatsApp not connected")
     
     try:
-        success = whatsapp_client.send_message(contact, message)
+        job = session.outbound_queue.submit(contact, message, "manual")
         
-        if success:
-            # Save message to database
-            new_message = Message(
+        def on_sent(future):
+            if not future.result():
+                return
+            # Save message to database, whether or not the caller waited for it
+            message_log.add(
+                account=session.account,
                 contact=contact,
                 message=message,
+                direction="outbound",
                 is_automated=False
             )
-            db.add(new_message)
-            db.commit()
-            
             logger.info(f"Manual message sent to {contact}")
-            return {"success": True, "message": "Message sent successfully"}
+        
+        job.future.add_done_callback(on_sent)
+        
+        if not wait:
+            return {"success": True, "message": "Message queued", "job_id": job.id}
+        
+        success = await asyncio.wrap_future(job.future)
+        
+        if success:
+            return {"success": True, "message": "Message sent successfully", "job_id": job.id}
         else:
             raise HTTPException(status_code=500, detail="Failed to send message")
             
@@ -241,14 +373,17 @@ async def schedule_message(
     contact: str = Form(...),
     message: str = Form(...),
     schedule_time: str = Form(...),
-    db: Session = Depends(get_db)
+    timezone: str = Form(None)
 ):
     """Schedule a message"""
+    if not scheduler:
+        raise HTTPException(status_code=400, detail="Scheduler not initialized")
+    
     try:
-        if not scheduler:
-            raise HTTPException(status_code=400, detail="Scheduler not initialized")
-        
-        success = scheduler.add_scheduled_message(contact, message, schedule_time)
+        try:
+            success = scheduler.add_scheduled_message(contact, message, schedule_time, timezone)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
         
         if success:
             logger.info(f"Message scheduled for {contact} at {schedule_time}")
@@ -265,17 +400,25 @@ async def add_automation_rule(
     trigger_keyword: str = Form(...),
     response_template: str = Form(...),
     use_ai: bool = Form(True),
-    db: Session = Depends(get_db)
+    cache_responses: bool = Form(False),
+    debounce_seconds: Optional[float] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add new automation rule"""
+    if debounce_seconds is not None and debounce_seconds < 0:
+        raise HTTPException(status_code=400, detail="debounce_seconds cannot be negative")
+    
     try:
         new_rule = AutomationRule(
             trigger_keyword=trigger_keyword,
             response_template=response_template,
-            use_ai=use_ai
+            use_ai=use_ai,
+            cache_responses=cache_responses,
+            debounce_seconds=debounce_seconds
         )
         db.add(new_rule)
-        db.commit()
+        await db.commit()
+        rule_index.add_rule(new_rule)
         
         logger.info(f"New automation rule added: {trigger_keyword}")
         return {"success": True, "message": "Automation rule added successfully"}
@@ -284,44 +427,237 @@ async def add_automation_rule(
         logger.error(f"Error adding automation rule: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to add rule: {e}")
 
+def _message_to_dict(msg: Message) -> dict:
+    return {
+        "id": msg.id,
+        "account": msg.account,
+        "contact": msg.contact,
+        "message": msg.message,
+        "response": msg.response,
+        "timestamp": msg.timestamp.isoformat(),
+        "is_automated": msg.is_automated,
+        "sentiment": msg.sentiment,
+        "sentiment_confidence": msg.sentiment_confidence
+    }
+
+async def _message_cursor(db: AsyncSession, message_id: int):
+    """(timestamp, id) of a message, the position used for keyset pagination"""
+    row = (await db.execute(
+        select(Message.timestamp, Message.id).where(Message.id == message_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Message {message_id} not found")
+    return tuple(row)
+
+@app.post("/campaigns")
+async def create_campaign(
+    name: str = Form(...),
+    template: str = Form(...),
+    contacts: UploadFile = File(...),
+    personalize: bool = Form(False),
+    rate_per_minute: float = Form(None),
+    start: bool = Form(True),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create a broadcast campaign from a CSV contact list"""
+    if rate_per_minute is not None and rate_per_minute <= 0:
+        raise HTTPException(status_code=400, detail="rate_per_minute must be greater than 0")
+    try:
+        recipients = parse_contacts_csv((await contacts.read()).decode("utf-8-sig"))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid contact list: {e}")
+    if not recipients:
+        raise HTTPException(status_code=400, detail="The contact list has no recipients")
+    
+    campaign = Campaign(
+        name=name,
+        template=template,
+        personalize=personalize,
+        rate_per_minute=rate_per_minute or config.CAMPAIGN_RATE_PER_MINUTE,
+        total=len(recipients)
+    )
+    db.add(campaign)
+    await db.flush()
+    await db.execute(insert(CampaignRecipient), create_campaign_rows(campaign.id, recipients))
+    await db.commit()
+    logger.info(f"Campaign {campaign.id} created with {len(recipients)} recipients")
+    
+    started = False
+    if start and campaign_runner:
+        started = await asyncio.to_thread(campaign_runner.start, campaign.id)
+    
+    return {"success": True, "campaign_id": campaign.id, "recipients": len(recipients), "started": started}
+
+@app.post("/campaigns/{campaign_id}/{action}")
+async def control_campaign(campaign_id: int, action: str):
+    """Start, pause or cancel a campaign"""
+    if action not in ("start", "pause", "cancel"):
+        raise HTTPException(status_code=404, detail="Unknown campaign action")
+    if not campaign_runner:
+        raise HTTPException(status_code=400, detail="WhatsApp not connected")
+    
+    success = await asyncio.to_thread(getattr(campaign_runner, action), campaign_id)
+    if not success:
+        raise HTTPException(status_code=409, detail=f"Campaign {campaign_id} cannot {action}")
+    return {"success": True}
+
+@app.get("/api/campaigns")
+async def list_campaigns(db: AsyncSession = Depends(get_async_db)):
+    """Recent campaigns with progress and throughput"""
+    campaigns = (await db.scalars(select(Campaign).order_by(Campaign.id.desc()).limit(20))).all()
+    return {"campaigns": [_campaign_report(campaign) for campaign in campaigns]}
+
+@app.get("/api/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Progress and throughput report for one campaign"""
+    campaign = await db.get(Campaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return _campaign_report(campaign)
+
+def _campaign_report(campaign: Campaign) -> dict:
+    return campaign_runner.report(campaign) if campaign_runner else campaign_report(campaign)
+
 @app.get("/api/messages")
-async def get_messages(db: Session = Depends(get_db)):
-    """Get recent messages"""
-    messages = db.query(Message).order_by(Message.timestamp.desc()).limit(50).all()
-    return {"messages": [
-        {
-            "id": msg.id,
-            "contact": msg.contact,
-            "message": msg.message,
-            "response": msg.response,
-            "timestamp": msg.timestamp.isoformat(),
-            "is_automated": msg.is_automated
-        }
-        for msg in messages
-    ]}
+async def get_messages(
+    contact: Optional[str] = None,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get messages newest first, a page at a time.
+    
+    Pass oldest_id from a page as `before` for the next older page, or
+    newest_id as `after` for newer ones. `since` returns only messages
+    newer than a timestamp, for polling.
+    """
+    await asyncio.to_thread(message_log.flush)
+    
+    query = select(Message)
+    if contact:
+        query = query.where(Message.contact == contact)
+    if since:
+        if since.tzinfo:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        query = query.where(Message.timestamp > since)
+    
+    position = tuple_(Message.timestamp, Message.id)
+    if before is not None:
+        query = query.where(position < await _message_cursor(db, before))
+    if after is not None:
+        query = query.where(position > await _message_cursor(db, after))
+    
+    # Walk forward from the cursor when fetching newer messages
+    ascending = after is not None or since is not None
+    if ascending:
+        query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+    else:
+        query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+    
+    messages = list((await db.scalars(query.limit(limit + 1))).all())
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if ascending:
+        messages.reverse()
+    
+    return {
+        "messages": [_message_to_dict(msg) for msg in messages],
+        "newest_id": messages[0].id if messages else after,
+        "oldest_id": messages[-1].id if messages else before,
+        "has_more": has_more
+    }
+
+@app.get("/api/events")
+async def stream_events():
+    """Live feed of new messages, send results and connection changes (server-sent events)"""
+    return StreamingResponse(
+        event_bus.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/send-jobs/{job_id}")
+async def get_send_job(job_id: int):
+    """Get the status of a queued outbound message"""
+    # Job ids are unique across sessions, so ask each queue
+    job = None
+    for account in session_pool.accounts():
+        session = session_pool.get(account)
+        if session and session.outbound_queue:
+            job = session.outbound_queue.get_job(job_id)
+            if job:
+                break
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @app.get("/api/status")
 async def get_status():
     """Get current system status"""
+    client = default_client()
+    session = session_pool.get()
     return {
-        "whatsapp_connected": whatsapp_client.is_connected if whatsapp_client else False,
+        "whatsapp_connected": session_pool.route() is not None,
+        "connection": client.connection_status() if client else None,
         "automation_active": automation_active,
         "setup_complete": whatsapp_setup_complete,
-        "scheduler_running": scheduler is not None
+        "scheduler_running": scheduler is not None,
+        "scheduler": scheduler.stats() if scheduler else None,
+        "outbound": session.outbound_queue.stats() if session and session.outbound_queue else None,
+        "sessions": session_pool.stats(),
+        "reply_pipeline": reply_pipeline.stats(),
+        "coalescer": coalescer.stats(),
+        "sentiment": sentiment_batcher.stats(),
+        "message_log": message_log.stats(),
+        "events": event_bus.stats(),
+        "completion_cache": openai_handler.cache.stats(),
+        "ai_tokens": openai_handler.token_usage.stats(),
+        "latency": client.latency.summary() if client else None
     }
 
+@app.on_event("startup")
+async def startup_event():
+    """Load automation rules and start background services"""
+    db = SessionLocal()
+    try:
+        rule_index.load(db)
+        logger.info(f"Loaded {len(rule_index)} automation rules")
+    finally:
+        db.close()
+    
+    message_log.start()
+    reply_pipeline.start()
+    coalescer.start()
+    event_bus.publish("automation", {"active": automation_active})
+    
+    if config.SENTIMENT_ANALYSIS:
+        sentiment_batcher.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
-    global whatsapp_client, scheduler
-    
     logger.info("Shutting down application...")
     
     if scheduler:
         scheduler.stop_scheduler()
     
-    if whatsapp_client:
-        whatsapp_client.close()
+    if campaign_runner:
+        campaign_runner.stop()
+    
+    # Answer any held turns, giving the replies a bounded time to be generated and sent
+    coalescer.stop()
+    reply_pipeline.stop(drain=config.SHUTDOWN_DRAIN_SECONDS)
+    
+    # Stops each account's send queue, then its browser
+    session_pool.close_all(drain=config.SHUTDOWN_DRAIN_SECONDS)
+    
+    # Write out buffered messages, including replies sent during shutdown
+    message_log.stop()
+    sentiment_batcher.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,252 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import logging
+import threading
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class LoggedMessage:
+    """A Message row buffered in the write-behind log"""
+
+    def __init__(self, fields: Dict):
+        self.fields = fields
+        self.id = None
+        self.state = "pending"  # pending -> flushing -> stored | dropped
+        self.late_updates: Dict = {}  # Updates that arrived while the row was being flushed
+        self.future = Future()  # Resolves to the row id, or None if the row was dropped
+
+
+class MessageLog:
+    """Write-behind buffer for the messages table.
+
+    Inserts and updates are collected in memory and written in a single
+    transaction once max_rows are pending or the oldest change has waited
+    max_delay seconds. Updates to a row that has not been flushed yet are
+    folded into its insert. Readers call flush() first to see their writes.
+    """
+
+    def __init__(self, session_factory, max_rows: int = None, max_delay: float = None,
+                 recent_ids: int = 10000, on_flush: Callable[[List[Dict], Dict[int, Dict]], None] = None):
+        self.session_factory = session_factory
+        self.on_flush = on_flush  # Called with the rows inserted and updated by each flush
+        self.max_rows = max_rows or config.MESSAGE_LOG_MAX_ROWS
+        self.max_delay = max_delay if max_delay is not None else config.MESSAGE_LOG_MAX_DELAY
+        self._inserts: List[LoggedMessage] = []
+        self._updates: Dict[int, Dict] = {}
+        self._oldest = None  # When the oldest unflushed change was made
+        self._recent_external_ids = OrderedDict()
+        self._recent_capacity = recent_ids
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.running = False
+        self._thread = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+
+    def start(self):
+        """Start the background flusher"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"Message log started (flush every {self.max_rows} rows or {self.max_delay * 1000:.0f} ms)")
+
+    def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.flush()
+        logger.info("Message log stopped")
+
+    def add(self, **fields) -> LoggedMessage:
+        """Buffer a new Message row"""
+        fields.setdefault("timestamp", datetime.utcnow())
+        entry = LoggedMessage(fields)
+        with self._condition:
+            self._inserts.append(entry)
+            external_id = fields.get("external_id")
+            if external_id:
+                self._remember(external_id)
+            self._changed()
+        return entry
+
+    def update(self, entry: LoggedMessage, **fields):
+        """Buffer changes to a row added through this log"""
+        with self._condition:
+            if entry.state == "pending":
+                entry.fields.update(fields)
+            elif entry.state == "flushing":
+                entry.late_updates.update(fields)
+            elif entry.state == "stored":
+                self._updates.setdefault(entry.id, {}).update(fields)
+                self._changed()
+
+    def is_duplicate(self, external_id: Optional[str]) -> bool:
+        """Whether a WhatsApp message ID has already been logged"""
+        if not external_id:
+            return False
+        with self._condition:
+            if external_id in self._recent_external_ids:
+                return True
+
+        from app.database import Message
+
+        db = self.session_factory()
+        try:
+            exists = db.query(Message.id).filter(Message.external_id == external_id).first() is not None
+        finally:
+            db.close()
+        if exists:
+            with self._condition:
+                self._remember(external_id)
+        return exists
+
+    @property
+    def depth(self) -> int:
+        return len(self._inserts) + len(self._updates)
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self.depth,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "avg_rows_per_flush": round(self.rows_written / self.flushes, 1) if self.flushes else None,
+            "failed_flushes": self.failed_flushes,
+        }
+
+    def flush(self) -> int:
+        """Write all buffered changes in one transaction; returns the rows written"""
+        with self._flush_lock:
+            with self._condition:
+                inserts, self._inserts = self._inserts, []
+                updates, self._updates = self._updates, {}
+                self._oldest = None
+                for entry in inserts:
+                    entry.state = "flushing"
+            if not inserts and not updates:
+                return 0
+
+            try:
+                ids = self._write(inserts, updates)
+            except Exception as e:
+                logger.error(f"Error flushing message log, will retry: {e}")
+                self.failed_flushes += 1
+                with self._condition:
+                    for entry in inserts:
+                        entry.state = "pending"
+                        entry.fields.update(entry.late_updates)
+                        entry.late_updates = {}
+                    self._inserts[:0] = inserts
+                    for row_id, fields in updates.items():
+                        fields.update(self._updates.get(row_id, {}))
+                        self._updates[row_id] = fields
+                    self._changed()
+                return 0
+
+            with self._condition:
+                for entry, row_id in zip(inserts, ids):
+                    entry.id = row_id
+                    entry.state = "stored" if row_id is not None else "dropped"
+                    if row_id is not None and entry.late_updates:
+                        self._updates.setdefault(row_id, {}).update(entry.late_updates)
+                        self._changed()
+                    entry.late_updates = {}
+            self.flushes += 1
+            self.rows_written += sum(1 for row_id in ids if row_id is not None) + len(updates)
+
+        for entry in inserts:
+            entry.future.set_result(entry.id)
+        if self.on_flush:
+            try:
+                self.on_flush(
+                    [dict(entry.fields, id=entry.id) for entry in inserts if entry.id is not None],
+                    updates
+                )
+            except Exception as e:
+                logger.error(f"Error in message log flush listener: {e}")
+        return len(inserts) + len(updates)
+
+    def _write(self, inserts: List[LoggedMessage], updates: Dict[int, Dict]) -> List[Optional[int]]:
+        from app.database import Message
+
+        db = self.session_factory()
+        try:
+            rows = [Message(**entry.fields) for entry in inserts]
+            try:
+                db.add_all(rows)
+                db.flush()
+            except IntegrityError:
+                # A replayed external_id slipped through; insert row by row and skip it
+                db.rollback()
+                rows = [self._insert_one(db, Message, entry) for entry in inserts]
+            ids = [row.id if row is not None else None for row in rows]
+            if updates:
+                db.bulk_update_mappings(Message, [
+                    dict(fields, id=row_id) for row_id, fields in updates.items()
+                ])
+            db.commit()
+            return ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _insert_one(self, db, model, entry: LoggedMessage):
+        row = model(**entry.fields)
+        try:
+            with db.begin_nested():
+                db.add(row)
+            return row
+        except IntegrityError:
+            logger.info(f"Skipping duplicate message {entry.fields.get('external_id')}")
+            return None
+
+    def _changed(self):
+        """Note a buffered change; the caller holds the condition"""
+        if self._oldest is None:
+            # Wake the flusher so it starts timing the delay from this change
+            self._oldest = time.time()
+            self._condition.notify()
+        elif self.depth >= self.max_rows:
+            self._condition.notify()
+
+    def _remember(self, external_id: str):
+        self._recent_external_ids[external_id] = True
+        self._recent_external_ids.move_to_end(external_id)
+        while len(self._recent_external_ids) > self._recent_capacity:
+            self._recent_external_ids.popitem(last=False)
+
+    def _wait_for_flush(self) -> bool:
+        """Block until a flush is due; False once stopped"""
+        with self._condition:
+            while self.running:
+                if self.depth >= self.max_rows:
+                    return True
+                if self._oldest is not None:
+                    remaining = self._oldest + self.max_delay - time.time()
+                    if remaining <= 0:
+                        return True
+                    self._condition.wait(timeout=remaining)
+                else:
+                    self._condition.wait(timeout=1)
+            return False
+
+    def _run(self):
+        while self._wait_for_flush():
+            if not self.flush() and self.depth:
+                # The write failed; give the database a moment before retrying
+                time.sleep(self.max_delay or 0.1)
@@ -1,18 +1,47 @@
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Tuple
+import asyncio
 import json
 import os
+import re
+
+from app.completion_cache import build_completion_cache, cache_key
+from app.config import config
+from app.context_builder import ContextBuilder, ContextWindow, TokenUsage
+from app.conversation_store import ConversationStore, build_conversation_store, conversation_key
+
+CHAT_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = """You are a helpful WhatsApp assistant. 
+Keep responses concise and friendly. 
+Respond naturally as if you're texting on WhatsApp.
+Use emojis when appropriate but don't overuse them."""
+
+# Dropped turns are folded into the rolling summary in batches of this size
+SUMMARY_BATCH_TURNS = 6
+
+# End of a sentence: closing punctuation (and any closing quote or bracket)
+# followed by whitespace, or a line break
+SENTENCE_END_RE = re.compile(r"""[.!?…]+["')\]]*\s+|\n+""")
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "e.g", "i.e", "vs", "approx"}
+
+# Completion budget per item of a sentiment batch; one result object is 22+ tokens
+SENTIMENT_TOKENS_PER_ITEM = 30
 
 class OpenAIHandler:
-    def __init__(self):
+    def __init__(self, history: ConversationStore = None):
         self.client = None
-        self.conversation_history = {}
+        self.async_client = None
+        self.history = history or build_conversation_store()
+        self.context_builder = ContextBuilder(SYSTEM_PROMPT, config.CONTEXT_TOKEN_BUDGET)
+        self.token_usage = TokenUsage()
+        self.cache = build_completion_cache()
+        self._summary_tasks = set()
         self._initialize_client()
     
     def _initialize_client(self):
         """Initialize OpenAI client with error handling"""
         try:
-            from openai import OpenAI
-            from app.config import config
+            from openai import AsyncOpenAI, OpenAI
             
             api_key = getattr(config, 'OPENAI_API_KEY', None) or os.getenv('OPENAI_API_KEY')
             
@@ -20,7 +49,11 @@ class OpenAIHandler:
                 print("Warning: No OpenAI API key found. AI features will be disabled.")
                 return
             
-            self.client = OpenAI(api_key=api_key)
+            base_url = getattr(config, 'OPENAI_BASE_URL', None)
+            self.client = OpenAI(api_key=api_key, base_url=base_url)
+            self.async_client = AsyncOpenAI(
+                api_key=api_key, base_url=base_url, max_retries=0
+            )
             print("OpenAI client initialized successfully")
             
         except ImportError as e:
@@ -30,52 +63,38 @@ class OpenAIHandler:
             print(f"Failed to initialize OpenAI client: {e}")
             print("AI features will be disabled")
     
-    def generate_response(self, message: str, contact: str, context: str = None) -> str:
+    def generate_response(self, message: str, contact: str, context: str = None,
+                          use_cache: bool = False, account: str = None) -> str:
         """Generate AI response using OpenAI GPT"""
         if not self.client:
             return "AI is currently unavailable. Please check your OpenAI API configuration."
         
         try:
-            # Initialize conversation history for contact if not exists
-            if contact not in self.conversation_history:
-                self.conversation_history[contact] = []
-            
-            # Add user message to history
-            self.conversation_history[contact].append({
-                "role": "user",
-                "content": message
-            })
-            
-            # Keep only last 10 messages to avoid token limits
-            if len(self.conversation_history[contact]) > 10:
-                self.conversation_history[contact] = self.conversation_history[contact][-10:]
+            conversation = conversation_key(account, contact)
+            window = self._build_context(message, conversation, context, shared=use_cache)
             
-            # System prompt
-            system_prompt = """You are a helpful WhatsApp assistant. 
-            Keep responses concise and friendly. 
-            Respond naturally as if you're texting on WhatsApp.
-            Use emojis when appropriate but don't overuse them."""
-            
-            if context:
-                system_prompt += f"\nAdditional context: {context}"
-            
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.extend(self.conversation_history[contact])
+            key = self._reply_cache_key(message, context)
+            cached = self.cache.lookup(key) if use_cache else None
+            if cached is not None:
+                self.history.append(conversation, "assistant", cached)
+                return cached
             
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
+                model=CHAT_MODEL,
+                messages=window.messages,
                 max_tokens=150,
                 temperature=0.7
             )
+            self.token_usage.record(window.input_tokens, response.usage)
             
             ai_response = response.choices[0].message.content.strip()
+            self.history.append(conversation, "assistant", ai_response)
+            if use_cache:
+                self.cache.set(key, ai_response, config.CACHE_TTL_REPLY)
             
-            # Add AI response to conversation history
-            self.conversation_history[contact].append({
-                "role": "assistant",
-                "content": ai_response
-            })
+            turns = self._turns_to_summarize(window)
+            if turns:
+                self._update_summary(conversation, turns)
             
             return ai_response
             
@@ -83,11 +102,175 @@ class OpenAIHandler:
             print(f"Error generating AI response: {e}")
             return "Sorry, I'm having trouble responding right now. Please try again later."
     
+    async def agenerate_response(self, message: str, contact: str, context: str = None,
+                                 use_cache: bool = False, account: str = None) -> str:
+        """Generate AI response with the async client; raises on failure so callers can fall back"""
+        if not self.async_client:
+            raise RuntimeError("AI is currently unavailable")
+        
+        conversation = conversation_key(account, contact)
+        window = self._build_context(message, conversation, context, shared=use_cache)
+        
+        key = self._reply_cache_key(message, context)
+        cached = self.cache.lookup(key) if use_cache else None
+        if cached is not None:
+            self.history.append(conversation, "assistant", cached)
+            return cached
+        
+        response = await self.async_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=window.messages,
+            max_tokens=150,
+            temperature=0.7
+        )
+        self.token_usage.record(window.input_tokens, response.usage)
+        
+        ai_response = response.choices[0].message.content.strip()
+        self._store_reply(conversation, key, ai_response, window, use_cache)
+        return ai_response
+    
+    async def astream_response(self, message: str, contact: str, context: str = None,
+                               use_cache: bool = False, account: str = None) -> AsyncIterator[str]:
+        """Stream an AI reply, yielding it in sentence chunks as they are generated.
+        
+        Raises on failure like agenerate_response. The whole reply goes into
+        the history and the cache once the stream has finished.
+        """
+        if not self.async_client:
+            raise RuntimeError("AI is currently unavailable")
+        
+        conversation = conversation_key(account, contact)
+        window = self._build_context(message, conversation, context, shared=use_cache)
+        chunker = SentenceChunker()
+        
+        key = self._reply_cache_key(message, context)
+        cached = self.cache.lookup(key) if use_cache else None
+        if cached is not None:
+            self.history.append(conversation, "assistant", cached)
+            for chunk in chunker.feed(cached) + chunker.flush():
+                yield chunk
+            return
+        
+        stream = await self.async_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=window.messages,
+            max_tokens=150,
+            temperature=0.7,
+            stream=True
+        )
+        parts = []
+        async for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                parts.append(delta)
+                for chunk in chunker.feed(delta):
+                    yield chunk
+        for chunk in chunker.flush():
+            yield chunk
+        # Stream chunks carry no usage, so only the estimate is recorded
+        self.token_usage.record(window.input_tokens)
+        
+        self._store_reply(conversation, key, "".join(parts).strip(), window, use_cache)
+    
+    def _store_reply(self, conversation: Tuple[str, str], key: str, reply: str, window: ContextWindow,
+                     use_cache: bool):
+        """Record an async reply in history and the cache, summarising in the background"""
+        self.history.append(conversation, "assistant", reply)
+        if use_cache:
+            self.cache.set(key, reply, config.CACHE_TTL_REPLY)
+        
+        # Summarise in the background so the reply is not held up
+        turns = self._turns_to_summarize(window)
+        if turns:
+            task = asyncio.get_running_loop().create_task(self._aupdate_summary(conversation, turns))
+            self._summary_tasks.add(task)
+            task.add_done_callback(self._summary_tasks.discard)
+    
+    def _reply_cache_key(self, message: str, context: str = None) -> str:
+        """Cache key for a shared reply: the rule context and the normalised message"""
+        normalised = " ".join(message.lower().split())
+        return cache_key("reply", CHAT_MODEL, normalised, context=context, max_tokens=150, temperature=0.7)
+    
+    def _build_context(self, message: str, conversation: Tuple[str, str], context: str = None,
+                       shared: bool = False) -> ContextWindow:
+        """Record the user message and pack the history into the token budget.
+        
+        A shared reply, one that may be served from the cache to any
+        contact, is generated from the new message alone so it carries
+        nothing from this conversation.
+        """
+        self.history.append(conversation, "user", message)
+        if shared:
+            return self.context_builder.build([{"role": "user", "content": message}], context)
+        return self.context_builder.build(
+            self.history.get(conversation), context, self.history.get_summary(conversation)
+        )
+    
+    def _turns_to_summarize(self, window: ContextWindow) -> List[Dict]:
+        """Dropped turns not yet in the rolling summary, once there are enough of them"""
+        if not config.HISTORY_SUMMARY:
+            return []
+        turns = [entry for entry in window.dropped if not entry.get("summarized")]
+        if len(turns) < SUMMARY_BATCH_TURNS:
+            return []
+        for entry in turns:
+            entry["summarized"] = True
+        return turns
+    
+    def _summary_request(self, conversation: Tuple[str, str], turns: List[Dict]) -> Dict:
+        """Completion arguments that fold older turns into the contact's summary"""
+        transcript = "\n".join(f"{entry['role']}: {entry['content']}" for entry in turns)
+        prompt = f"""
+        Update the running summary of a WhatsApp conversation with the new turns below.
+        Keep it under 80 words and keep names, dates and open questions.
+        Current summary: {self.history.get_summary(conversation) or "(none)"}
+        New turns:
+        {transcript}
+        """
+        return {
+            "model": CHAT_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 120,
+            "temperature": 0.3
+        }
+    
+    def _update_summary(self, conversation: Tuple[str, str], turns: List[Dict]):
+        """Fold dropped turns into the contact's rolling summary"""
+        try:
+            response = self.client.chat.completions.create(**self._summary_request(conversation, turns))
+            self.history.set_summary(conversation, response.choices[0].message.content.strip())
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+            for entry in turns:
+                entry["summarized"] = False
+    
+    async def _aupdate_summary(self, conversation: Tuple[str, str], turns: List[Dict]):
+        """Async variant of _update_summary"""
+        try:
+            response = await self.async_client.chat.completions.create(
+                **self._summary_request(conversation, turns)
+            )
+            self.history.set_summary(conversation, response.choices[0].message.content.strip())
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+            for entry in turns:
+                entry["summarized"] = False
+    
+    def add_reply_to_history(self, contact: str, reply: str, account: str = None):
+        """Add an assistant reply to the contact's conversation history on an account"""
+        self.history.append(conversation_key(account, contact), "assistant", reply)
+    
     def generate_scheduled_message(self, template: str, contact: str, **kwargs) -> str:
         """Generate personalized scheduled message"""
         if not self.client:
             return template  # Fallback to original template
             
+        key = cache_key("scheduled", CHAT_MODEL, template, contact=contact,
+                        kwargs=kwargs, max_tokens=100, temperature=0.8)
+        cached = self.cache.lookup(key)
+        if cached is not None:
+            return cached
+        
         try:
             prompt = f"""
             Create a personalized message based on this template: "{template}"
@@ -96,13 +279,15 @@ class OpenAIHandler:
             """
             
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=CHAT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=100,
                 temperature=0.8
             )
             
-            return response.choices[0].message.content.strip()
+            personalized = response.choices[0].message.content.strip()
+            self.cache.set(key, personalized, config.CACHE_TTL_SCHEDULED)
+            return personalized
             
         except Exception as e:
             print(f"Error generating scheduled message: {e}")
@@ -110,25 +295,139 @@ class OpenAIHandler:
     
     def analyze_sentiment(self, message: str) -> Dict:
         """Analyze message sentiment"""
-        if not self.client:
-            return {"sentiment": "neutral", "confidence": 0.5}
-            
         try:
-            prompt = f"""
-            Analyze the sentiment of this message: "{message}"
-            Respond with JSON format: {{"sentiment": "positive/negative/neutral", "confidence": 0.0-1.0}}
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=50,
-                temperature=0.1
-            )
-            
-            result = json.loads(response.choices[0].message.content.strip())
-            return result
-            
+            result = self.analyze_sentiment_batch([message])[0]
         except Exception as e:
             print(f"Error analyzing sentiment: {e}")
-            return {"sentiment": "neutral", "confidence": 0.5}
+            result = None
+        return result or {"sentiment": "neutral", "confidence": 0.5}
+    
+    def analyze_sentiment_batch(self, messages: List[str]) -> List[Dict]:
+        """Classify several messages with one completion.
+        
+        Returns a result per message in input order; None marks a message the
+        model skipped or answered malformed, so the caller can retry it.
+        Raises RuntimeError when AI is unavailable, rather than guessing.
+        """
+        results = [None] * len(messages)
+        if not self.client:
+            raise RuntimeError("AI is currently unavailable")
+        
+        keys = [cache_key("sentiment", CHAT_MODEL, message, max_tokens=50, temperature=0.1)
+                for message in messages]
+        pending = []
+        for i, key in enumerate(keys):
+            cached = self.cache.lookup(key)
+            if cached is not None:
+                results[i] = json.loads(cached)
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+        
+        items = [{"id": n, "text": messages[i]} for n, i in enumerate(pending)]
+        prompt = f"""
+        Analyze the sentiment of each message in this JSON array: {json.dumps(items, ensure_ascii=False)}
+        Respond with only a JSON array containing one object per message, in the same order:
+        [{{"id": 0, "sentiment": "positive/negative/neutral", "confidence": 0.0-1.0}}]
+        """
+        
+        response = self.client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=SENTIMENT_TOKENS_PER_ITEM * len(items) + 20,
+            temperature=0.1
+        )
+        
+        for n, result in parse_sentiment_batch(response.choices[0].message.content, len(items)).items():
+            i = pending[n]
+            results[i] = result
+            self.cache.set(keys[i], json.dumps(result), config.CACHE_TTL_SENTIMENT)
+        return results
+
+
+class SentenceChunker:
+    """Splits streamed text into messages at sentence boundaries.
+    
+    The first chunk is released as soon as one sentence is complete, so
+    the contact sees the start of the reply early; later chunks gather
+    sentences until they reach min_chars, so a long reply is not sent as
+    a string of one-line messages.
+    """
+    
+    def __init__(self, min_chars: int = None):
+        self.min_chars = min_chars or config.STREAM_CHUNK_CHARS
+        self.chunks = 0
+        self._buffer = ""
+    
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text; returns the chunks that are now complete"""
+        self._buffer += text
+        ready = []
+        cut = self._next_cut()
+        while cut:
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:]
+            if chunk:
+                ready.append(chunk)
+                self.chunks += 1
+            cut = self._next_cut()
+        return ready
+    
+    def flush(self) -> List[str]:
+        """The rest of the text once the stream has ended"""
+        chunk, self._buffer = self._buffer.strip(), ""
+        if not chunk:
+            return []
+        self.chunks += 1
+        return [chunk]
+    
+    def _next_cut(self) -> int:
+        """End of the first sentence boundary that completes a chunk, or 0"""
+        min_chars = 1 if self.chunks == 0 else self.min_chars
+        for match in SENTENCE_END_RE.finditer(self._buffer):
+            words = self._buffer[:match.start()].split()
+            if not words or words[-1].lower().rstrip(".") in ABBREVIATIONS:
+                continue
+            if len(self._buffer[:match.end()].strip()) >= min_chars:
+                return match.end()
+        return 0
+
+
+SENTIMENT_LABELS = {"positive", "negative", "neutral"}
+SENTIMENT_OBJECT_RE = re.compile(r"\{[^{}]*\}")
+
+
+def parse_sentiment_batch(content: str, count: int) -> Dict[int, Dict]:
+    """Valid results from a batch sentiment reply, keyed by item id.
+    
+    A reply cut off by max_tokens has no closing bracket; the complete
+    objects before the cut are still used.
+    """
+    content = (content or "").strip()
+    start, end = content.find("["), content.rfind("]")
+    if start == -1:
+        return {}
+    try:
+        items = json.loads(content[start:end + 1]) if end > start else None
+    except ValueError:
+        items = None
+    if items is None:
+        items = []
+        for match in SENTIMENT_OBJECT_RE.finditer(content, start):
+            try:
+                items.append(json.loads(match.group(0)))
+            except ValueError:
+                continue
+    
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            n = int(item["id"])
+            sentiment = str(item["sentiment"]).strip().lower()
+            confidence = min(max(float(item["confidence"]), 0.0), 1.0)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= n < count and sentiment in SENTIMENT_LABELS:
+            results[n] = {"sentiment": sentiment, "confidence": confidence}
+    return results
@@ -0,0 +1,286 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.config import config
+from app.waits import LatencyProfile
+
+logger = logging.getLogger(__name__)
+
+# Outbound traffic classes, most urgent first
+LANES = ("interactive", "manual", "scheduled", "bulk")
+
+# Upper bounds (seconds) of the per-lane latency histogram buckets
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300)
+
+
+class SendJob:
+    """A single queued outbound message"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, contact: str, message: str, lane: str = "manual"):
+        self.id = next(self._ids)
+        self.contact = contact
+        self.message = message
+        self.lane = lane
+        self.created_at = time.time()
+        self.started_at = None
+        self.sent_at = None
+        self.future = Future()
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "queued"
+        return "sent" if self.future.result() else "failed"
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "contact": self.contact,
+            "lane": self.lane,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "sent_at": self.sent_at,
+        }
+
+
+class LaneStats:
+    """Send counts and queued-to-sent latency for one lane"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.latency = LatencyProfile(window=1000)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, job: SendJob, success: bool, now: float):
+        if not success:
+            self.failed += 1
+            return
+        self.sent += 1
+        elapsed = now - job.created_at
+        self.latency.record("wait", (job.started_at or now) - job.created_at)
+        self.latency.record("total", elapsed)
+        index = 0
+        while index < len(LATENCY_BUCKETS) and elapsed > LATENCY_BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+
+    def histogram(self) -> Dict[str, int]:
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        return dict(zip(labels, self.buckets))
+
+
+class OutboundQueue:
+    """Outbound send queue drained by a single worker that owns the browser.
+
+    Jobs wait in one of the LANES and the worker serves lanes by weighted
+    fair queueing: each lane carries a virtual pass that advances by
+    1/weight per message sent, and the non-empty lane with the lowest pass
+    goes next, so replies keep flowing while a scheduled or bulk burst is
+    queued. A lane that goes idle re-enters at the current virtual time
+    instead of banking credit, and the head job's wait earns its lane up to
+    one unit of pass (a bulk send's worth, over OUTBOUND_AGING_SECONDS) so
+    long-waiting work edges ahead without overturning the weights.
+    Consecutive jobs for the same contact within a lane are coalesced so
+    the chat is searched and opened once per batch.
+    """
+
+    def __init__(self, whatsapp_client, max_batch: int = 20, history_size: int = 1000,
+                 on_complete: Callable[[SendJob], None] = None, weights: Dict[str, float] = None,
+                 aging: float = None):
+        self.whatsapp_client = whatsapp_client
+        self.on_complete = on_complete
+        self.max_batch = max_batch
+        self.weights = dict(config.OUTBOUND_LANE_WEIGHTS, **(weights or {}))
+        self.aging = aging or config.OUTBOUND_AGING_SECONDS
+        self._lanes: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self._pass: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self._vtime = 0.0
+        self._lane_stats: Dict[str, LaneStats] = {lane: LaneStats() for lane in LANES}
+        self._condition = threading.Condition()
+        self._jobs = OrderedDict()  # Recent jobs by id, for status lookups
+        self._history_size = history_size
+        self._send_times = deque()
+        self.sent = 0
+        self.failed = 0
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info("Outbound send queue started")
+
+    def stop(self, drain: float = 0):
+        """Stop the worker, first giving queued jobs up to drain seconds to go out, and fail the rest"""
+        deadline = time.time() + drain
+        with self._condition:
+            while self.running and any(self._lanes.values()) and time.time() < deadline:
+                self._condition.wait(min(0.1, deadline - time.time()))
+            self.running = False
+            pending = [job for queue in self._lanes.values() for job in queue]
+            for queue in self._lanes.values():
+                queue.clear()
+            self._condition.notify_all()
+        for job in pending:
+            self._finish(job, False)
+        if pending:
+            logger.warning(f"Outbound send queue stopped with {len(pending)} messages unsent")
+        logger.info("Outbound send queue stopped")
+
+    def submit(self, contact: str, message: str, lane: str = "manual") -> SendJob:
+        """Queue a message on a lane without blocking; returns the job.
+
+        On a stopped queue the job fails straight away, since no worker
+        would ever send it.
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown outbound lane '{lane}'")
+        job = SendJob(contact, message, lane)
+        with self._condition:
+            stopped = not self.running
+            if stopped:
+                self.failed += 1
+                self._lane_stats[lane].record(job, False, time.time())
+            else:
+                queue = self._lanes[lane]
+                if not queue:
+                    # Re-enter at the current virtual time; idle lanes do not bank credit
+                    self._pass[lane] = max(self._pass[lane], self._vtime)
+                queue.append(job)
+                self._condition.notify()
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._history_size:
+                self._jobs.popitem(last=False)
+        if stopped:
+            logger.warning(f"Send queue is stopped; message to {contact} failed")
+            self._finish(job, False)
+        return job
+
+    async def send(self, contact: str, message: str, lane: str = "manual") -> bool:
+        """Queue a message and wait for the result without blocking the event loop"""
+        job = self.submit(contact, message, lane)
+        return await asyncio.wrap_future(job.future)
+
+    def get_job(self, job_id: int) -> Optional[SendJob]:
+        """Look up a recently submitted job"""
+        return self._jobs.get(job_id)
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def stats(self) -> Dict:
+        """Queue depth, send rate over the last minute and per-lane latency"""
+        now = time.time()
+        with self._condition:
+            self._trim_send_times(now)
+            recent = len(self._send_times)
+            depths = {lane: len(queue) for lane, queue in self._lanes.items()}
+        lanes = {}
+        for lane, stats in self._lane_stats.items():
+            lanes[lane] = {
+                "weight": self.weights[lane],
+                "depth": depths[lane],
+                "sent": stats.sent,
+                "failed": stats.failed,
+                "latency": stats.latency.summary(),
+                "histogram": stats.histogram(),
+            }
+        return {
+            "depth": sum(depths.values()),
+            "sent": self.sent,
+            "failed": self.failed,
+            "sends_per_minute": recent,
+            "lanes": lanes,
+        }
+
+    def _pick_lane(self, now: float) -> str:
+        """The non-empty lane with the lowest pass after crediting its head job's wait"""
+        best, best_score = None, None
+        for lane, queue in self._lanes.items():
+            if not queue:
+                continue
+            score = self._pass[lane] - min((now - queue[0].created_at) / self.aging, 1.0)
+            if best is None or score < best_score:
+                best, best_score = lane, score
+        return best
+
+    def _next_batch(self) -> List[SendJob]:
+        """Pop the head job of the next lane plus its consecutive jobs for the same contact"""
+        with self._condition:
+            while self.running and not self.depth:
+                self._condition.wait(timeout=1)
+            if not self.running:
+                return []
+
+            now = time.time()
+            lane = self._pick_lane(now)
+            queue = self._lanes[lane]
+            batch = [queue.popleft()]
+            while (
+                queue
+                and len(batch) < self.max_batch
+                and queue[0].contact == batch[0].contact
+            ):
+                batch.append(queue.popleft())
+            self._vtime = max(self._vtime, self._pass[lane])
+            self._pass[lane] += len(batch) / self.weights[lane]
+            for job in batch:
+                job.started_at = now
+            return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            contact = batch[0].contact
+            try:
+                results = self.whatsapp_client.send_messages(
+                    contact, [job.message for job in batch]
+                )
+            except Exception as e:
+                logger.error(f"Error sending queued messages to {contact}: {e}")
+                results = [False] * len(batch)
+
+            now = time.time()
+            with self._condition:
+                for job, success in zip(batch, results):
+                    if success:
+                        self.sent += 1
+                        self._send_times.append(now)
+                        self._trim_send_times(now)
+                        job.sent_at = now
+                    else:
+                        self.failed += 1
+                    self._lane_stats[job.lane].record(job, bool(success), now)
+            for job, success in zip(batch, results):
+                self._finish(job, bool(success))
+
+    def _trim_send_times(self, now: float):
+        """Keep only the last minute of send times; the caller holds the condition"""
+        while self._send_times and now - self._send_times[0] > 60:
+            self._send_times.popleft()
+
+    def _finish(self, job: SendJob, success: bool):
+        job.future.set_result(success)
+        if self.on_complete:
+            try:
+                self.on_complete(job)
+            except Exception as e:
+                logger.error(f"Error in send completion listener: {e}")
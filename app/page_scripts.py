@@ -0,0 +1,287 @@
+"""JavaScript snippets executed inside the WhatsApp Web page"""
+
+# Installs a MutationObserver that pushes incoming message bubbles into
+# window.__waQueue, then drains that queue. Running install and drain in the
+# same script keeps monitoring at one WebDriver round trip per tick and
+# re-installs the observer transparently after a page reload.
+OBSERVE_AND_DRAIN_MESSAGES_JS = r"""
+const maxItems = arguments[0] || 200;
+
+function chatTitle() {
+    const header = document.querySelector(
+        '#main header [data-testid="conversation-info-header-chat-title"], #main header span[title]'
+    );
+    if (!header) return null;
+    return header.getAttribute('title') || header.textContent || null;
+}
+
+function parsePrePlainText(value) {
+    // Format: "[10:32, 17/10/2026] Alice: "
+    const match = /^\[([^\]]+)\]\s*(.*?):\s*$/.exec(value || '');
+    if (!match) return { when: null, author: null };
+    return { when: match[1], author: match[2] };
+}
+
+function extractMessage(node) {
+    const row = node.closest ? node.closest('[data-id]') : null;
+    if (!row) return null;
+    const id = row.getAttribute('data-id');
+    const incoming = row.classList.contains('message-in') || !!row.querySelector('.message-in');
+    if (!incoming) return null;
+
+    const copyable = row.querySelector('.copyable-text[data-pre-plain-text]');
+    const meta = parsePrePlainText(copyable ? copyable.getAttribute('data-pre-plain-text') : '');
+    const textNode = row.querySelector(
+        'span.selectable-text, span[data-testid="conversation-text"], span.copyable-text, div.copyable-text'
+    );
+    const text = textNode ? textNode.innerText : '';
+    if (!text) return null;
+
+    const chat = chatTitle();
+    return {
+        id: id,
+        sender: chat || meta.author || 'Unknown',
+        author: meta.author,
+        message: text,
+        sent_at: meta.when,
+        timestamp: Date.now() / 1000
+    };
+}
+
+function seedSeen(state) {
+    document.querySelectorAll('#main [data-id]').forEach(function (row) {
+        state.seen.add(row.getAttribute('data-id'));
+    });
+}
+
+if (!window.__waObserver) {
+    const state = { queue: [], seen: new Set(), chat: chatTitle() };
+    seedSeen(state);
+
+    const observer = new MutationObserver(function (mutations) {
+        const chat = chatTitle();
+        if (chat !== state.chat) {
+            // Switching chats re-renders the whole history; treat it as seen.
+            state.chat = chat;
+            seedSeen(state);
+            return;
+        }
+        for (const mutation of mutations) {
+            for (const added of mutation.addedNodes) {
+                if (added.nodeType !== 1) continue;
+                const rows = added.matches('[data-id]') ? [added] : added.querySelectorAll('[data-id]');
+                for (const row of rows) {
+                    const id = row.getAttribute('data-id');
+                    if (state.seen.has(id)) continue;
+                    const message = extractMessage(row);
+                    if (!message) continue;
+                    state.seen.add(id);
+                    state.queue.push(message);
+                }
+            }
+        }
+        if (state.seen.size > 5000) {
+            state.seen = new Set(Array.from(state.seen).slice(-2500));
+        }
+    });
+    observer.observe(document.body, { childList: true, subtree: true });
+    window.__waObserver = observer;
+    window.__waState = state;
+}
+
+const state = window.__waState;
+const drained = state.queue.splice(0, maxItems);
+const connected = !!document.querySelector(
+    '[data-testid="chat-list"], [aria-label="Chat list"], #pane-side'
+);
+return { connected: connected, messages: drained, pending: state.queue.length };
+"""
+
+# Reads everything a poll needs in one round trip: the last bubbles of the
+# open chat (both directions) plus the latest preview of every other chat
+# with an unread badge. Returns the connection flag, the open chat's title
+# and a flat list of entries.
+SCRAPE_MESSAGES_JS = r"""
+const maxBubbles = arguments[0] || 20;
+
+function chatTitle() {
+    const header = document.querySelector(
+        '#main header [data-testid="conversation-info-header-chat-title"], #main header span[title]'
+    );
+    if (!header) return null;
+    return header.getAttribute('title') || header.textContent || null;
+}
+
+function parsePrePlainText(value) {
+    // Format: "[10:32, 17/10/2026] Alice: "
+    const match = /^\[([^\]]+)\]\s*(.*?):\s*$/.exec(value || '');
+    if (!match) return { when: null, author: null };
+    return { when: match[1], author: match[2] };
+}
+
+function firstMatch(root, selectors) {
+    for (const selector of selectors) {
+        const element = root.querySelector(selector);
+        if (element) return element;
+    }
+    return null;
+}
+
+const chat = chatTitle();
+const entries = [];
+
+const rows = document.querySelectorAll('#main [data-id]');
+for (let i = Math.max(0, rows.length - maxBubbles); i < rows.length; i++) {
+    const row = rows[i];
+    const id = row.getAttribute('data-id');
+    const textNode = row.querySelector(
+        'span.selectable-text, span[data-testid="conversation-text"], span.copyable-text, div.copyable-text'
+    );
+    const text = textNode ? textNode.innerText : '';
+    if (!text) continue;
+    // Bubble classes first; otherwise data-id starts with "true_" for messages sent from this account
+    let outgoing = row.classList.contains('message-out') || !!row.querySelector('.message-out');
+    if (!outgoing && !row.classList.contains('message-in') && !row.querySelector('.message-in')) {
+        outgoing = id.indexOf('true_') === 0;
+    }
+    const copyable = row.querySelector('.copyable-text[data-pre-plain-text]');
+    const meta = parsePrePlainText(copyable ? copyable.getAttribute('data-pre-plain-text') : '');
+    entries.push({
+        id: id,
+        direction: outgoing ? 'out' : 'in',
+        chat: chat,
+        author: meta.author,
+        message: text,
+        sent_at: meta.when
+    });
+}
+
+const items = new Set(document.querySelectorAll(
+    '#pane-side [role="listitem"], [data-testid="chat-list"] [role="listitem"]'
+));
+for (const item of items) {
+    const badge = firstMatch(item, [
+        '[data-testid="icon-unread-count"]', 'span[aria-label*="unread"]'
+    ]);
+    if (!badge) continue;
+    const titleNode = firstMatch(item, [
+        '[data-testid="cell-frame-title"] span[title]', '[data-testid="cell-frame-title"][title]', 'span[title]'
+    ]);
+    const title = titleNode ? titleNode.getAttribute('title') : null;
+    if (!title || title === chat) continue;
+    const preview = firstMatch(item, [
+        '[data-testid="last-msg-status"] span[title]', 'span[data-testid="last-msg"]',
+        '[data-testid="cell-frame-secondary"] span[title]'
+    ]);
+    const text = preview ? (preview.getAttribute('title') || preview.textContent) : '';
+    if (!text) continue;
+    const when = item.querySelector('[data-testid="cell-frame-primary-detail"]');
+    entries.push({
+        id: null,
+        direction: 'in',
+        chat: title,
+        author: null,
+        message: text,
+        sent_at: when ? when.textContent.trim() : null,
+        unread: parseInt(badge.textContent, 10) || 1
+    });
+}
+
+const connected = !!document.querySelector(
+    '[data-testid="chat-list"], [aria-label="Chat list"], #pane-side'
+);
+return { connected: connected, chat: chat, entries: entries };
+"""
+
+# Lists every chat in the chat list that shows an unread badge, for the
+# unread sweeper: [{chat, unread, last_at}] in chat list order.
+LIST_UNREAD_CHATS_JS = r"""
+function firstMatch(root, selectors) {
+    for (const selector of selectors) {
+        const element = root.querySelector(selector);
+        if (element) return element;
+    }
+    return null;
+}
+
+const chats = [];
+const items = new Set(document.querySelectorAll(
+    '#pane-side [role="listitem"], [data-testid="chat-list"] [role="listitem"]'
+));
+for (const item of items) {
+    const badge = firstMatch(item, [
+        '[data-testid="icon-unread-count"]', 'span[aria-label*="unread"]'
+    ]);
+    if (!badge) continue;
+    const titleNode = firstMatch(item, [
+        '[data-testid="cell-frame-title"] span[title]', '[data-testid="cell-frame-title"][title]', 'span[title]'
+    ]);
+    const title = titleNode ? titleNode.getAttribute('title') : null;
+    if (!title) continue;
+    const when = item.querySelector('[data-testid="cell-frame-primary-detail"]');
+    chats.push({
+        chat: title,
+        unread: parseInt(badge.textContent, 10) || 1,
+        last_at: when ? when.textContent.trim() : null
+    });
+}
+return chats;
+"""
+
+DISCONNECT_MESSAGE_OBSERVER_JS = r"""
+if (window.__waObserver) {
+    window.__waObserver.disconnect();
+    window.__waObserver = null;
+    window.__waState = null;
+}
+"""
+
+CURRENT_CHAT_TITLE_JS = r"""
+const header = document.querySelector(
+    '#main header [data-testid="conversation-info-header-chat-title"], #main header span[title]'
+);
+if (!header) return null;
+return header.getAttribute('title') || header.textContent || null;
+"""
+
+# Returns [index, element] for the first candidate selector that matches
+# (optionally only visible, enabled elements), or null.
+FIND_FIRST_SELECTOR_JS = r"""
+const selectors = arguments[0];
+const visibleOnly = arguments[1];
+for (let i = 0; i < selectors.length; i++) {
+    const elements = document.querySelectorAll(selectors[i]);
+    for (const element of elements) {
+        if (!visibleOnly) return [i, element];
+        const rects = element.getClientRects();
+        if (rects.length && !element.disabled) return [i, element];
+    }
+}
+return null;
+"""
+
+# One-shot connection probe: 'connected', 'qr' (waiting for a scan) or 'loading'
+CONNECTION_STATE_JS = r"""
+const chatListSelectors = arguments[0];
+const qrSelectors = arguments[1];
+if (chatListSelectors.some(function (s) { return document.querySelector(s); })) return 'connected';
+if (qrSelectors.some(function (s) { return document.querySelector(s); })) return 'qr';
+return 'loading';
+"""
+
+# Replaces the compose box contents with arguments[1] in one input event,
+# instead of one WebDriver keystroke per character. execCommand keeps the
+# editor's own input handling (and so its send button) in step; the
+# fallback sets the text directly. Returns whether the box holds the text.
+INSERT_TEXT_JS = r"""
+const box = arguments[0];
+const text = arguments[1];
+box.focus();
+document.execCommand('selectAll', false, null);
+if (!document.execCommand('insertText', false, text)) {
+    box.textContent = text;
+    box.dispatchEvent(new InputEvent('input', {bubbles: true, inputType: 'insertText', data: text}));
+}
+const squash = (value) => value.replace(/\s+/g, ' ').trim();
+return squash(box.innerText) === squash(text);
+"""
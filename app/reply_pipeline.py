@@ -0,0 +1,193 @@
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+from app.config import config
+from app.waits import LatencyProfile
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyRequest:
+    """An inbound message waiting for an AI reply"""
+
+    def __init__(self, contact: str, message: str, template: str, context: Optional[Dict] = None,
+                 account: str = None):
+        self.contact = contact
+        self.account = account
+        self.message = message
+        self.template = template
+        self.context = context or {}
+        self.created_at = time.time()
+        self.chunks: List[str] = []  # Parts of a streamed reply already handed to on_chunk
+        self.future = Future()
+
+
+class ReplyPipeline:
+    """Generates AI replies off the monitor thread.
+
+    Runs its own event loop on a background thread with AsyncOpenAI. Each
+    contact on each account gets a worker task so replies to it stay in order,
+    while a semaphore bounds how many completions run at once overall.
+    Timeouts and API errors fall back to the rule's static template.
+
+    In streaming mode each sentence chunk goes to on_chunk as soon as it is
+    generated, and on_reply then gets the whole reply with request.chunks
+    set; a reply that fails part way keeps the chunks already sent.
+    """
+
+    def __init__(self, openai_handler, on_reply: Callable[[ReplyRequest, str, bool], None],
+                 concurrency: int = None, timeout: float = None,
+                 on_chunk: Callable[[ReplyRequest, str], None] = None, streaming: bool = None):
+        self.openai_handler = openai_handler
+        self.on_reply = on_reply
+        self.on_chunk = on_chunk
+        self.streaming = (config.AI_STREAMING if streaming is None else streaming) and on_chunk is not None
+        self.concurrency = concurrency or config.AI_CONCURRENCY
+        self.timeout = timeout or config.AI_TIMEOUT
+        self.loop = None
+        self._thread = None
+        self._semaphore = None
+        self._queues: Dict[Tuple[str, str], asyncio.Queue] = {}  # By (account, contact)
+        self._ready = threading.Event()
+        self.completed = 0
+        self.fallbacks = 0
+        self.in_flight = 0
+        self.pending = 0  # Queued or in progress
+        self.latency = LatencyProfile(window=1000)
+
+    def start(self):
+        """Start the event loop thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        logger.info(f"Reply pipeline started (concurrency {self.concurrency})")
+
+    def stop(self, drain: float = 0):
+        """Stop the event loop, first waiting up to drain seconds for pending replies.
+
+        Replies still pending after that are abandoned.
+        """
+        if self.loop and self.loop.is_running():
+            if drain:
+                try:
+                    asyncio.run_coroutine_threadsafe(self._drain(), self.loop).result(timeout=drain)
+                except Exception:
+                    pass
+            if self.pending:
+                logger.warning(f"Reply pipeline stopping with {self.pending} replies unanswered")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+        logger.info("Reply pipeline stopped")
+
+    def submit(self, contact: str, message: str, template: str, context: Dict = None,
+               account: str = None) -> ReplyRequest:
+        """Queue a message for a reply on an account; safe to call from any thread"""
+        request = ReplyRequest(contact, message, template, context, account)
+        self.loop.call_soon_threadsafe(self._enqueue, request)
+        return request
+
+    def stats(self) -> Dict:
+        return {
+            "concurrency": self.concurrency,
+            "active_contacts": len(self._queues),
+            "in_flight": self.in_flight,
+            "pending": self.pending,
+            "completed": self.completed,
+            "fallbacks": self.fallbacks,
+            "streaming": self.streaming,
+            "latency": self.latency.summary(),
+        }
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _drain(self):
+        while self.pending:
+            await asyncio.sleep(0.05)
+
+    def _enqueue(self, request: ReplyRequest):
+        self.pending += 1
+        key = (request.account, request.contact)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+            self.loop.create_task(self._contact_worker(key, queue))
+        queue.put_nowait(request)
+
+    async def _contact_worker(self, key: Tuple[str, str], queue: asyncio.Queue):
+        """Process one contact's messages strictly in arrival order"""
+        while True:
+            request = await queue.get()
+            await self._process(request)
+            self.pending -= 1
+            if queue.empty():
+                # Nothing else for this contact; release the worker
+                del self._queues[key]
+                return
+
+    async def _process(self, request: ReplyRequest):
+        used_ai = True
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                if self.streaming:
+                    reply = await asyncio.wait_for(self._stream(request), timeout=self.timeout)
+                else:
+                    reply = await asyncio.wait_for(
+                        self.openai_handler.agenerate_response(
+                            request.message, request.contact, request.template,
+                            use_cache=request.context.get("use_cache", False), account=request.account
+                        ),
+                        timeout=self.timeout
+                    )
+            except Exception as e:
+                if request.chunks:
+                    # The start of the reply has already gone out; keep it rather than add the template
+                    logger.warning(f"AI reply for {request.contact} stopped after {len(request.chunks)} chunk(s) ({e!r})")
+                    reply = " ".join(request.chunks)
+                else:
+                    logger.warning(f"AI reply for {request.contact} failed ({e!r}), using template")
+                    reply = request.template
+                    used_ai = False
+                    self.fallbacks += 1
+                self.openai_handler.add_reply_to_history(request.contact, reply, account=request.account)
+            finally:
+                self.in_flight -= 1
+
+        self.completed += 1
+        self.latency.record("reply", time.time() - request.created_at)
+        try:
+            self.on_reply(request, reply, used_ai)
+        except Exception as e:
+            logger.error(f"Error delivering reply to {request.contact}: {e}")
+        request.future.set_result(reply)
+
+    async def _stream(self, request: ReplyRequest) -> str:
+        """Hand each chunk of a streamed reply to on_chunk; returns the whole reply"""
+        async for chunk in self.openai_handler.astream_response(
+            request.message, request.contact, request.template,
+            use_cache=request.context.get("use_cache", False), account=request.account
+        ):
+            if not request.chunks:
+                self.latency.record("first_chunk", time.time() - request.created_at)
+            request.chunks.append(chunk)
+            try:
+                self.on_chunk(request, chunk)
+            except Exception as e:
+                logger.error(f"Error delivering reply chunk to {request.contact}: {e}")
+        return " ".join(request.chunks)
@@ -0,0 +1,135 @@
+from collections import deque
+from typing import Dict, List, Optional
+import threading
+
+
+class RuleMatch:
+    """Lightweight snapshot of a matched automation rule"""
+
+    __slots__ = ("rule_id", "trigger_keyword", "response_template", "use_ai", "cache_responses",
+                 "debounce_seconds")
+
+    def __init__(self, rule_id: int, trigger_keyword: str, response_template: str, use_ai: bool,
+                 cache_responses: bool = False, debounce_seconds: Optional[float] = None):
+        self.rule_id = rule_id
+        self.trigger_keyword = trigger_keyword
+        self.response_template = response_template
+        self.use_ai = use_ai
+        self.cache_responses = cache_responses
+        self.debounce_seconds = debounce_seconds
+
+
+class RuleIndex:
+    """In-memory Aho-Corasick index over active automation rules.
+
+    Rules are prioritised by id, which is the order the old per-message
+    query returned them in, so the first matching rule stays the same.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Node 0 is the root. Each node has goto edges, a failure link, the
+        # lowest rule id whose keyword ends exactly there (terminal) and the
+        # lowest rule id ending there or at any suffix (output).
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminal: List[Optional[int]] = [None]
+        self._output: List[Optional[int]] = [None]
+        self._rules: Dict[int, RuleMatch] = {}
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._rules)
+
+    def load(self, db):
+        """Rebuild the index from the active rules in the database"""
+        from app.database import AutomationRule
+
+        rules = db.query(AutomationRule).filter(
+            AutomationRule.is_active == True
+        ).order_by(AutomationRule.id).all()
+
+        with self._lock:
+            self._reset()
+            for rule in rules:
+                self._insert(rule)
+            self._build_failure_links()
+
+    def add_rule(self, rule):
+        """Add a single committed rule without rebuilding the whole automaton"""
+        if not rule.is_active:
+            return
+        with self._lock:
+            self._insert(rule)
+            self._dirty = True
+
+    def match(self, message: str) -> Optional[RuleMatch]:
+        """Return the highest-priority rule whose keyword occurs in the message"""
+        text = message.lower()
+        with self._lock:
+            if self._dirty:
+                self._build_failure_links()
+            if not self._rules:
+                return None
+
+            goto, fail, output = self._goto, self._fail, self._output
+            best = output[0]  # Empty keywords match every message
+            node = 0
+            for char in text:
+                while node and char not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(char, 0)
+                found = output[node]
+                if found is not None and (best is None or found < best):
+                    best = found
+
+            return self._rules[best] if best is not None else None
+
+    def _insert(self, rule):
+        keyword = (rule.trigger_keyword or "").lower()
+        self._rules[rule.id] = RuleMatch(
+            rule.id, rule.trigger_keyword, rule.response_template, rule.use_ai,
+            bool(getattr(rule, "cache_responses", False)),
+            getattr(rule, "debounce_seconds", None)
+        )
+
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._output.append(None)
+                self._goto[node][char] = next_node
+            node = next_node
+
+        current = self._terminal[node]
+        if current is None or rule.id < current:
+            self._terminal[node] = rule.id
+
+    def _build_failure_links(self):
+        goto, fail = self._goto, self._fail
+        output = list(self._terminal)
+
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0) if node else 0
+                queue.append(child)
+
+            if node:
+                inherited = output[fail[node]]
+                if inherited is not None and (output[node] is None or inherited < output[node]):
+                    output[node] = inherited
+
+        self._output = output
+        self._dirty = False
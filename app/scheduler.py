@@ -1,18 +1,79 @@
-import schedule
+import heapq
+import itertools
 import time
 import threading
-from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam
+from app.config import config
+from app.cron import CronSchedule, get_timezone, parse_schedule
 from app.database import SessionLocal, ScheduledMessage
 from app.whatsapp_client import WhatsAppClient
 from app.openai_handler import OpenAIHandler
+from app.outbound import OutboundQueue
+from app.waits import LatencyProfile
+
+class ScheduledJob:
+    """An active scheduled message and its next fire time (naive UTC)"""
+
+    def __init__(self, job_id: int, contact: str, message: str, schedule: CronSchedule,
+                 next_fire_at: datetime):
+        self.id = job_id
+        self.contact = contact
+        self.message = message
+        self.schedule = schedule
+        self.next_fire_at = next_fire_at
+        self.version = 0  # Bumped on re-registration so stale heap entries are skipped
+
+class ScheduledRun:
+    """One occurrence of a job, from personalisation to hand-off to the send path"""
+
+    def __init__(self, job: ScheduledJob, planned: datetime, next_fire_at: datetime):
+        self.job = job
+        self.version = job.version
+        self.planned = planned  # Naive UTC
+        self.next_fire_at = next_fire_at  # The job's occurrence after this one
+        self.future: Optional[Future] = None  # Resolves to the personalised message
+        self.fired_at: Optional[datetime] = None
 
 class MessageScheduler:
-    def __init__(self, whatsapp_client: WhatsAppClient, openai_handler: OpenAIHandler):
+    """Fires scheduled messages from a min-heap of due times.
+
+    The thread sleeps until the earliest deadline (or until an earlier job
+    is added), so jobs fire on time rather than on a polling tick. Next fire
+    times are persisted on the scheduled_messages rows; jobs missed while
+    the app was down fire once on load if still within the misfire grace.
+
+    Dispatch runs in two stages so the thread never blocks on OpenAI or the
+    browser: a job is personalised on a worker pool SCHEDULER_PREFETCH
+    seconds ahead of its deadline, and at the deadline the message is handed
+    to the outbound queue. Planned and actual fire times are recorded so
+    schedule lag shows up in stats().
+    """
+
+    def __init__(self, whatsapp_client: WhatsAppClient, openai_handler: OpenAIHandler,
+                 outbound_queue: OutboundQueue = None, prefetch: float = None,
+                 workers: int = None):
         self.whatsapp_client = whatsapp_client
         self.openai_handler = openai_handler
+        self.outbound_queue = outbound_queue
+        self.prefetch = config.SCHEDULER_PREFETCH if prefetch is None else prefetch
+        self.workers = workers or config.SCHEDULER_PERSONALIZE_WORKERS
         self.running = False
+        self.jobs: Dict[int, ScheduledJob] = {}
+        self._heap = []  # (due timestamp, sequence, job id, version)
+        self._runs = []  # Prefetched runs awaiting their deadline: (due timestamp, sequence, run)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.lag = LatencyProfile(window=1000)
+        self.fired = 0
+        self.sent = 0
+        self.failed = 0
         self.setup_scheduled_jobs()
-    
+
     def setup_scheduled_jobs(self):
         """Setup all scheduled jobs from database"""
         db = SessionLocal()
@@ -20,85 +81,280 @@ class MessageScheduler:
             scheduled_messages = db.query(ScheduledMessage).filter(
                 ScheduledMessage.is_active == True
             ).all()
-            
+
+            now = datetime.utcnow()
+            grace = timedelta(seconds=config.SCHEDULER_MISFIRE_GRACE)
+            changed = []
             for msg in scheduled_messages:
-                # Parse schedule time (simplified - you can make this more robust)
-                if "daily" in msg.scheduled_time.lower():
-                    time_part = msg.scheduled_time.split("at")[1].strip()
-                    schedule.every().day.at(time_part).do(
-                        self.send_scheduled_message,
-                        msg.contact,
-                        msg.message
-                    )
-                elif "weekly" in msg.scheduled_time.lower():
-                    # Handle weekly schedules
-                    pass
-                
+                try:
+                    schedule = parse_schedule(msg.scheduled_time, msg.timezone or config.SCHEDULER_TIMEZONE)
+                except ValueError as e:
+                    print(f"Skipping scheduled message {msg.id}: {e}")
+                    continue
+
+                next_fire_at = msg.next_fire_at
+                if next_fire_at is None:
+                    next_fire_at = schedule.next_after(now)
+                elif next_fire_at < now - grace:
+                    # Missed too long ago to be useful; resume from the next occurrence
+                    print(f"Skipping missed run of scheduled message {msg.id} due {next_fire_at}")
+                    next_fire_at = schedule.next_after(now)
+                # Anything else already due fires once as soon as the loop starts
+
+                if next_fire_at != msg.next_fire_at:
+                    changed.append({"id": msg.id, "next_fire_at": next_fire_at})
+                self.register(msg.id, msg.contact, msg.message, schedule, next_fire_at)
+
+            if changed:
+                db.bulk_update_mappings(ScheduledMessage, changed)
+                db.commit()
+            print(f"Loaded {len(self.jobs)} scheduled messages")
+
         except Exception as e:
             print(f"Error setting up scheduled jobs: {e}")
         finally:
             db.close()
-    
-    def send_scheduled_message(self, contact: str, message_template: str):
-        """Send a scheduled message"""
+
+    def register(self, job_id: int, contact: str, message: str, schedule: CronSchedule,
+                 next_fire_at: datetime) -> ScheduledJob:
+        """Add or replace a job; registering the same id twice never duplicates it"""
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                job = self.jobs[job_id] = ScheduledJob(job_id, contact, message, schedule, next_fire_at)
+            else:
+                job.contact, job.message, job.schedule = contact, message, schedule
+                job.next_fire_at = next_fire_at
+                job.version += 1
+            self._push(job)
+            return job
+
+    def _push(self, job: ScheduledJob):
+        """Queue a job's next fire time; the caller holds the condition"""
+        due = self._epoch(job.next_fire_at)
+        heapq.heappush(self._heap, (due, next(self._sequence), job.id, job.version))
+        if self._heap[0][2] == job.id:
+            # New earliest deadline; wake the loop so it re-arms its sleep
+            self._condition.notify()
+
+    @staticmethod
+    def _epoch(moment: datetime) -> float:
+        return (moment - datetime(1970, 1, 1)).total_seconds()
+
+    def next_due(self) -> Optional[datetime]:
+        """Earliest pending fire time"""
+        with self._condition:
+            while self._heap and self._is_stale(self._heap[0]):
+                heapq.heappop(self._heap)
+            return datetime.utcfromtimestamp(self._heap[0][0]) if self._heap else None
+
+    def _is_stale(self, entry) -> bool:
+        job = self.jobs.get(entry[2])
+        return job is None or job.version != entry[3]
+
+    def _pop_due(self, now: datetime,
+                 lookahead: float = 0) -> List[Tuple[ScheduledJob, datetime, datetime]]:
+        """Remove every job due within lookahead seconds of now and queue its next occurrence.
+
+        Returns (job, planned fire time, following fire time) triples."""
+        due = []
+        cutoff = self._epoch(now) + lookahead
+        with self._condition:
+            while self._heap and self._heap[0][0] <= cutoff:
+                entry = heapq.heappop(self._heap)
+                if self._is_stale(entry):
+                    continue
+                job = self.jobs[entry[2]]
+                planned = job.next_fire_at
+                job.next_fire_at = job.schedule.next_after(max(now, planned))
+                due.append((job, planned, job.next_fire_at))
+                self._push(job)
+        return due
+
+    def _wait_for_next(self):
+        """Sleep until the next prefetch or deadline, a new earlier job or stop"""
+        with self._condition:
+            while self.running:
+                while self._heap and self._is_stale(self._heap[0]):
+                    heapq.heappop(self._heap)
+                wake_times = [self._runs[0][0]] if self._runs else []
+                if self._heap:
+                    wake_times.append(self._heap[0][0] - self.prefetch)
+                if not wake_times:
+                    self._condition.wait()
+                    continue
+                delay = min(wake_times) - time.time()
+                if delay <= 0:
+                    return
+                self._condition.wait(timeout=delay)
+
+    def _prefetch(self, job: ScheduledJob, planned: datetime, next_fire_at: datetime) -> ScheduledRun:
+        """Stage one: start personalising an occurrence on the worker pool"""
+        run = ScheduledRun(job, planned, next_fire_at)
+        run.future = self._pool.submit(self._personalize, job.contact, job.message)
+        with self._condition:
+            heapq.heappush(self._runs, (self._epoch(planned), next(self._sequence), run))
+        return run
+
+    def _personalize(self, contact: str, message_template: str) -> str:
+        start = time.perf_counter()
+        try:
+            return self.openai_handler.generate_scheduled_message(message_template, contact)
+        except Exception as e:
+            print(f"Error personalising scheduled message for {contact}: {e}")
+            return message_template
+        finally:
+            self.lag.record("personalize", time.perf_counter() - start)
+
+    def _pop_runs(self, now: datetime) -> List[ScheduledRun]:
+        """Prefetched runs whose deadline has passed, in deadline order"""
+        cutoff = self._epoch(now)
+        runs = []
+        with self._condition:
+            while self._runs and self._runs[0][0] <= cutoff:
+                run = heapq.heappop(self._runs)[2]
+                if self.jobs.get(run.job.id) is run.job and run.job.version == run.version:
+                    runs.append(run)
+                # Otherwise the job was removed or edited after it was prefetched
+        return runs
+
+    def _dispatch(self, run: ScheduledRun, now: datetime):
+        """Stage two: hand the personalised message to the send path once it is ready"""
+        run.fired_at = now
+        # Inline if personalisation finished ahead of the deadline, else when it does
+        run.future.add_done_callback(
+            lambda future: future.cancelled() or self._hand_off(run, future.result())
+        )
+
+    def _hand_off(self, run: ScheduledRun, message: str):
+        handed_at = datetime.utcnow()
+        self.lag.record("fire_lag", (handed_at - run.planned).total_seconds())
+        contact = run.job.contact
+        if self.outbound_queue:
+            job = self.outbound_queue.submit(contact, message, "scheduled")
+            job.future.add_done_callback(lambda future: self._report_run(run, future.result()))
+        else:
+            self._pool.submit(
+                lambda: self._report_run(run, self.whatsapp_client.send_message(contact, message))
+            )
+
+    def _report_run(self, run: ScheduledRun, success: bool):
+        if success:
+            self.sent += 1
+            self.lag.record("send_lag", (datetime.utcnow() - run.planned).total_seconds())
+        else:
+            self.failed += 1
+        self._report_send(run.job.contact, success)
+
+    def _persist(self, runs: List[ScheduledRun]):
+        """Record planned and actual fire times and the next occurrences in one transaction"""
+        table = ScheduledMessage.__table__
+        db = SessionLocal()
         try:
-            # Generate personalized message using AI
-            personalized_message = self.openai_handler.generate_scheduled_message(
-                message_template, contact
+            # Plain executemany; a row deleted since it was loaded is simply not matched
+            db.execute(
+                table.update().where(table.c.id == bindparam("job_id")).values(
+                    last_planned_at=bindparam("planned_at"),
+                    last_fired_at=bindparam("fired_at"),
+                    next_fire_at=bindparam("next_at")
+                ),
+                [
+                    {"job_id": run.job.id, "planned_at": run.planned, "fired_at": run.fired_at,
+                     "next_at": run.next_fire_at}
+                    for run in runs
+                ]
             )
-            
-            # Send via WhatsApp
-            success = self.whatsapp_client.send_message(contact, personalized_message)
-            
-            if success:
-                print(f"Scheduled message sent to {contact}")
-            else:
-                print(f"Failed to send scheduled message to {contact}")
-                
+            db.commit()
         except Exception as e:
-            print(f"Error sending scheduled message: {e}")
-    
+            print(f"Error saving scheduled message fire times: {e}")
+        finally:
+            db.close()
+
+    def _report_send(self, contact: str, success: bool):
+        """Log the outcome of a scheduled send"""
+        if success:
+            print(f"Scheduled message sent to {contact}")
+        else:
+            print(f"Failed to send scheduled message to {contact}")
+
     def start_scheduler(self):
         """Start the scheduler in a separate thread"""
+        if self.running:
+            return
+
         def run_scheduler():
-            self.running = True
             while self.running:
-                schedule.run_pending()
-                time.sleep(60)  # Check every minute
-        
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+                self._wait_for_next()
+                if not self.running:
+                    break
+                now = datetime.utcnow()
+                for job, planned, next_fire_at in self._pop_due(now, self.prefetch):
+                    self._prefetch(job, planned, next_fire_at)
+                runs = self._pop_runs(now)
+                for run in runs:
+                    self._dispatch(run, now)
+                self.fired += len(runs)
+                if runs:
+                    # next_fire_at only moves past runs that were released, so a
+                    # restart re-fires anything that was merely prefetched
+                    self._persist(runs)
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scheduled")
+        self.running = True
+        self._thread = threading.Thread(target=run_scheduler, daemon=True)
+        self._thread.start()
         print("Message scheduler started")
-    
+
     def stop_scheduler(self):
         """Stop the scheduler"""
-        self.running = False
+        with self._condition:
+            self.running = False
+            self._runs.clear()
+            self._condition.notify_all()
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
         print("Message scheduler stopped")
-    
-    def add_scheduled_message(self, contact: str, message: str, schedule_time: str):
-        """Add a new scheduled message"""
+
+    def stats(self) -> Dict:
+        next_due = self.next_due()
+        lag = self.lag.summary()
+        return {
+            "jobs": len(self.jobs),
+            "fired": self.fired,
+            "sent": self.sent,
+            "failed": self.failed,
+            "prefetched": len(self._runs),
+            "next_due": next_due.isoformat() if next_due else None,
+            # fire_lag: deadline to hand-off; send_lag: deadline to sent
+            "lag": lag,
+        }
+
+    def add_scheduled_message(self, contact: str, message: str, schedule_time: str,
+                              timezone: str = None) -> bool:
+        """Add a new scheduled message; ValueError if the schedule cannot be parsed"""
+        timezone = timezone or config.SCHEDULER_TIMEZONE
+        schedule = parse_schedule(schedule_time, timezone)
+        next_fire_at = schedule.next_after(datetime.utcnow())
+
         db = SessionLocal()
         try:
             scheduled_msg = ScheduledMessage(
                 contact=contact,
                 message=message,
-                scheduled_time=schedule_time
+                scheduled_time=schedule_time,
+                timezone=get_timezone(timezone).key,
+                next_fire_at=next_fire_at
             )
             db.add(scheduled_msg)
             db.commit()
-            
+
             # Add to schedule
-            if "daily" in schedule_time.lower():
-                time_part = schedule_time.split("at")[1].strip()
-                schedule.every().day.at(time_part).do(
-                    self.send_scheduled_message, contact, message
-                )
-            
+            self.register(scheduled_msg.id, contact, message, schedule, next_fire_at)
+
             return True
-            
+
         except Exception as e:
             print(f"Error adding scheduled message: {e}")
             return False
         finally:
             db.close()
-
@@ -0,0 +1,174 @@
+from collections import deque
+from typing import Dict, List
+import logging
+import threading
+import time
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class SentimentItem:
+    """An inbound message waiting to be classified"""
+
+    def __init__(self, message_id: int, text: str):
+        self.message_id = message_id
+        self.text = text
+        self.attempts = 0
+
+
+class SentimentBatcher:
+    """Classifies inbound message sentiment in batches off the reply path.
+
+    Messages accumulate until a full batch is queued or the oldest has
+    waited flush_interval seconds, then a single completion scores the
+    whole batch. Items the model skips or answers malformed are re-queued
+    until max_attempts, and results are written to the Message rows.
+    """
+
+    def __init__(self, openai_handler, session_factory, batch_size: int = None,
+                 flush_interval: float = None, max_attempts: int = None):
+        self.openai_handler = openai_handler
+        self.session_factory = session_factory
+        self.batch_size = batch_size or config.SENTIMENT_BATCH_SIZE
+        self.flush_interval = flush_interval or config.SENTIMENT_FLUSH_INTERVAL
+        self.max_attempts = max_attempts or config.SENTIMENT_MAX_ATTEMPTS
+        self._pending = deque()
+        self._oldest = None  # When the oldest pending item was queued
+        self._condition = threading.Condition()
+        self.running = False
+        self._thread = None
+        self.batches = 0
+        self.scored = 0  # Items sent for scoring, retries included
+        self.classified = 0
+        self.requeued = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the worker thread"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"Sentiment batcher started (batch size {self.batch_size})")
+
+    def stop(self):
+        """Stop the worker after one last flush of whatever is queued"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout=30)
+        logger.info("Sentiment batcher stopped")
+
+    def submit(self, message_id: int, text: str):
+        """Queue a stored message for classification; never blocks"""
+        if not text or not self.openai_handler.client:
+            # Without AI there is nothing to classify with; leave the row unscored
+            return
+        with self._condition:
+            self._queue([SentimentItem(message_id, text)])
+
+    def stats(self) -> Dict:
+        return {
+            "queued": len(self._pending),
+            "batches": self.batches,
+            "classified": self.classified,
+            "avg_batch_size": round(self.scored / self.batches, 1) if self.batches else None,
+            "requeued": self.requeued,
+            "dropped": self.dropped,
+        }
+
+    def _queue(self, items: List[SentimentItem]):
+        """Append items; the caller holds the condition"""
+        if not self._pending:
+            self._oldest = time.time()
+        self._pending.extend(items)
+        if len(self._pending) >= self.batch_size:
+            self._condition.notify()
+
+    def _next_batch(self) -> List[SentimentItem]:
+        """Wait for a full batch or for the oldest item to reach the flush interval"""
+        with self._condition:
+            while self.running:
+                if len(self._pending) >= self.batch_size:
+                    break
+                if self._pending:
+                    remaining = self._oldest + self.flush_interval - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(timeout=remaining)
+                else:
+                    self._condition.wait(timeout=1)
+
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._oldest = time.time() if self._pending else None
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch and not self._classify(batch) and self.running:
+                # The API call itself failed; back off before retrying
+                with self._condition:
+                    self._condition.wait(timeout=self.flush_interval)
+            if not self.running:
+                if self._pending and batch:
+                    continue  # Keep flushing full batches on shutdown
+                return
+
+    def _classify(self, batch: List[SentimentItem]) -> bool:
+        """Score a batch and store the results; False if the request failed"""
+        ok = True
+        try:
+            results = self.openai_handler.analyze_sentiment_batch([item.text for item in batch])
+        except Exception as e:
+            logger.warning(f"Sentiment batch of {len(batch)} failed: {e}")
+            results = [None] * len(batch)
+            ok = False
+        self.batches += 1
+        self.scored += len(batch)
+
+        done = [(item, result) for item, result in zip(batch, results) if result]
+        retry = []
+        for item, result in zip(batch, results):
+            if result:
+                continue
+            item.attempts += 1
+            if item.attempts < self.max_attempts:
+                retry.append(item)
+            else:
+                self.dropped += 1
+                logger.warning(f"Giving up on sentiment for message {item.message_id}")
+
+        if retry:
+            self.requeued += len(retry)
+            with self._condition:
+                self._queue(retry)
+
+        if done:
+            self._store(done)
+        return ok
+
+    def _store(self, done):
+        from app.database import Message
+
+        db = self.session_factory()
+        try:
+            db.bulk_update_mappings(Message, [
+                {
+                    "id": item.message_id,
+                    "sentiment": result["sentiment"],
+                    "sentiment_confidence": result["confidence"],
+                }
+                for item, result in done
+            ])
+            db.commit()
+            self.classified += len(done)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error saving sentiment results: {e}")
+        finally:
+            db.close()
@@ -0,0 +1,258 @@
+from typing import Callable, Dict, List, Optional
+import logging
+import os
+import re
+import threading
+
+from app.config import config
+from app.database import User
+from app.outbound import OutboundQueue, SendJob
+from app.sweeper import UnreadSweeper
+from app.whatsapp_client import WhatsAppClient
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+def process_tree_usage(pid: Optional[int]) -> Optional[Dict]:
+    """Process count and resident memory of a process and its descendants.
+
+    Reads /proc, so it returns None where that is not available.
+    """
+    if not pid or not os.path.isdir("/proc"):
+        return None
+    children: Dict[int, List[int]] = {}
+    rss_pages: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm") as f:
+                rss_pages[int(entry)] = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # Exited while we were looking
+        # The command name may contain spaces, so split after its closing paren
+        parent = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        if current in rss_pages:
+            tree.append(current)
+        pending.extend(children.get(current, []))
+    if not tree:
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    return {
+        "processes": len(tree),
+        "rss_mb": round(sum(rss_pages[p] for p in tree) * page_size / 2**20, 1),
+    }
+
+
+class WhatsAppSession:
+    """One WhatsApp account: its browser, its profile and its send queue"""
+
+    def __init__(self, account: str, profile_dir: str, seen_messages_path: str,
+                 on_state_change: Callable[[str, Dict], None] = None):
+        self.account = account
+        self.profile_dir = profile_dir
+        self.seen_messages_path = seen_messages_path
+        self.on_state_change = on_state_change
+        self.client: Optional[WhatsAppClient] = None
+        self.outbound_queue: Optional[OutboundQueue] = None
+        self.sweeper: Optional[UnreadSweeper] = None
+        self.on_send: Optional[Callable[[SendJob], None]] = None
+        self.monitoring = False
+
+    @property
+    def is_connected(self) -> bool:
+        return bool(self.client and self.client.is_connected)
+
+    def open(self) -> bool:
+        """Start a browser on this account's profile and load WhatsApp Web"""
+        self.close()
+        self.client = WhatsAppClient(
+            on_state_change=lambda status: self._state_changed(status),
+            profile_dir=self.profile_dir,
+            seen_messages_path=self.seen_messages_path
+        )
+        return self.client.open_whatsapp_web()
+
+    def _state_changed(self, status: Dict):
+        if self.on_state_change:
+            self.on_state_change(self.account, status)
+
+    def start_services(self, message_handler: Callable[[Dict], None],
+                       on_send: Callable[[SendJob], None] = None):
+        """Start the send worker, inbound monitoring and unread sweeper once the account is connected"""
+        # Tag each inbound message with its account so replies route back here
+        def handle(message):
+            message_handler(dict(message, account=self.account))
+
+        self.on_send = on_send
+        if self.outbound_queue is None:
+            self.outbound_queue = OutboundQueue(self.client, on_complete=self._send_completed)
+            self.outbound_queue.start()
+        if not self.monitoring:
+            self.client.start_message_monitoring(handle)
+            if config.SWEEP_UNREAD:
+                self.sweeper = UnreadSweeper(self.client, handle)
+                self.sweeper.start()
+            self.monitoring = True
+
+    def _send_completed(self, job: SendJob):
+        if self.sweeper:
+            self.sweeper.note_sent(job)
+        if self.on_send:
+            self.on_send(job)
+
+    def close(self, drain: float = 0):
+        """Stop the sweeper and send worker and quit the browser; queued sends get drain seconds to go out"""
+        if self.sweeper:
+            self.sweeper.stop()
+            self.sweeper = None
+        if self.outbound_queue:
+            self.outbound_queue.stop(drain)
+            self.outbound_queue = None
+        if self.client:
+            self.client.close()
+            self.client = None
+        self.monitoring = False
+
+    def stats(self) -> Dict:
+        client = self.client
+        driver = client.driver if client else None
+        service = getattr(driver, "service", None)
+        process = getattr(service, "process", None)
+        return {
+            "account": self.account,
+            "profile_dir": self.profile_dir,
+            "connection": client.connection_status() if client else None,
+            "monitoring": self.monitoring,
+            "outbound": self.outbound_queue.stats() if self.outbound_queue else None,
+            "unread_sweeper": self.sweeper.stats() if self.sweeper else None,
+            # chromedriver plus the Chrome processes it started
+            "resources": process_tree_usage(process.pid if process else None),
+            "latency": client.latency.summary() if client else None,
+        }
+
+
+class SessionPool:
+    """WhatsApp sessions keyed by account, each with its own browser profile.
+
+    Every session runs its own driver, send queue and inbound monitor, so
+    accounts never wait on each other's browser. The users table records
+    the accounts and where their profiles live; work without an explicit
+    account goes to the default one.
+    """
+
+    def __init__(self, session_factory, on_state_change: Callable[[str, Dict], None] = None,
+                 profile_root: str = None, default_account: str = None):
+        self.session_factory = session_factory
+        self.on_state_change = on_state_change
+        self.profile_root = profile_root or config.SESSION_PROFILE_ROOT
+        self.default_account = default_account or config.DEFAULT_ACCOUNT
+        self.max_sessions = config.MAX_SESSIONS
+        self._sessions: Dict[str, WhatsAppSession] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def accounts(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def get(self, account: str = None) -> Optional[WhatsAppSession]:
+        """The session for an account, or the default account's"""
+        return self._sessions.get(account or self.default_account)
+
+    def route(self, account: str = None) -> Optional[WhatsAppSession]:
+        """The connected session for an account, or None"""
+        session = self.get(account)
+        return session if session and session.is_connected else None
+
+    def session(self, account: str = None) -> WhatsAppSession:
+        """Get or create the session for an account; ValueError for a bad name or a full pool"""
+        account = account or self.default_account
+        if not ACCOUNT_RE.match(account):
+            raise ValueError(f"Invalid account name '{account}'")
+        with self._lock:
+            session = self._sessions.get(account)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    raise ValueError(f"Session limit of {self.max_sessions} reached")
+                profile_dir = self._register_account(account)
+                session = self._sessions[account] = WhatsAppSession(
+                    account, profile_dir, self._seen_messages_path(account),
+                    self._state_changed
+                )
+            return session
+
+    def _seen_messages_path(self, account: str) -> str:
+        if account == self.default_account:
+            return config.SEEN_MESSAGES_PATH
+        root, ext = os.path.splitext(config.SEEN_MESSAGES_PATH)
+        return f"{root}.{account}{ext}"
+
+    def _register_account(self, account: str) -> str:
+        """Find or create the users row for an account; returns its profile dir"""
+        if account == self.default_account:
+            default_dir = config.CHROME_PROFILE_DIR
+        else:
+            default_dir = os.path.join(self.profile_root, account)
+        db = self.session_factory()
+        try:
+            user = db.query(User).filter(User.username == account).first()
+            if user is None:
+                user = User(username=account, profile_dir=default_dir)
+                db.add(user)
+            elif not user.profile_dir:
+                user.profile_dir = default_dir
+            profile_dir = user.profile_dir
+            db.commit()
+            return profile_dir
+        finally:
+            db.close()
+
+    def _state_changed(self, account: str, status: Dict):
+        db = self.session_factory()
+        try:
+            db.query(User).filter(User.username == account).update(
+                {"whatsapp_connected": status["connected"]}
+            )
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error recording connection state for {account}: {e}")
+        finally:
+            db.close()
+        if self.on_state_change:
+            self.on_state_change(account, status)
+
+    def close(self, account: str):
+        """Shut one session down and forget it"""
+        with self._lock:
+            session = self._sessions.pop(account, None)
+        if session:
+            session.close()
+
+    def close_all(self, drain: float = 0):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close(drain)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "count": len(sessions),
+            "connected": sum(1 for session in sessions if session.is_connected),
+            "default_account": self.default_account,
+            "sessions": [session.stats() for session in sessions],
+        }
@@ -0,0 +1,168 @@
+from typing import Callable, Dict, List
+import logging
+import threading
+import time
+
+from app.config import config
+from app.waits import LatencyProfile
+
+logger = logging.getLogger(__name__)
+
+# How long an unanswered chat is tracked for time-to-first-reply
+REPLY_TRACKING_SECONDS = 86400
+
+
+class UnreadSweeper:
+    """Reads chats with unread badges so messages outside the open chat are handled.
+
+    Each cycle lists the unread chats in one script call and ranks them by
+    unread count (capped at what one visit reads) plus how long they have
+    been waiting (every SWEEP_AGE_WEIGHT seconds counts as one more unread
+    message). Only the top SWEEP_VISIT_BUDGET chats are opened, reading at
+    most SWEEP_MAX_MESSAGES from each, so a busy group cannot starve quieter
+    chats; the rest keep aging until they win a slot. Time from first
+    seeing a chat's badge to the first reply sent to it is recorded across
+    all chats.
+    """
+
+    def __init__(self, whatsapp_client, callback: Callable[[Dict], None], interval: float = None,
+                 visit_budget: int = None, max_messages: int = None, age_weight: float = None):
+        self.whatsapp_client = whatsapp_client
+        self.callback = callback
+        self.interval = interval or config.SWEEP_INTERVAL
+        self.visit_budget = visit_budget or config.SWEEP_VISIT_BUDGET
+        self.max_messages = max_messages or config.SWEEP_MAX_MESSAGES
+        self.age_weight = age_weight or config.SWEEP_AGE_WEIGHT
+        self._waiting: Dict[str, float] = {}  # Chat -> when its badge was first seen
+        self._awaiting_reply: Dict[str, float] = {}  # Chat -> when it started waiting, until we reply
+        self._lock = threading.Lock()
+        self.latency = LatencyProfile(window=1000)
+        self.cycles = 0
+        self.visits = 0
+        self.dispatched = 0
+        self.deferred = 0
+        self.running = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sweeping from a background thread"""
+        if self.running:
+            return
+        self.running = True
+        self._stop_event.clear()
+        # Unread chats are read here, so the poll monitor skips their previews
+        self.whatsapp_client.sweep_unread = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info("Unread chat sweeper started")
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.whatsapp_client.sweep_unread = False
+        logger.info("Unread chat sweeper stopped")
+
+    def _run(self):
+        while self.running:
+            if self.whatsapp_client.is_connected:
+                try:
+                    self.sweep_once()
+                except Exception as e:
+                    logger.error(f"Error sweeping unread chats: {e}")
+            self._stop_event.wait(self.interval)
+
+    def rank(self, chats: List[Dict], now: float) -> List[Dict]:
+        """Unread chats, most urgent first"""
+        def priority(chat):
+            age = now - self._waiting.get(chat["chat"], now)
+            # A visit reads at most max_messages, so a busier chat ranks no higher
+            return min(chat["unread"], self.max_messages) + age / self.age_weight
+        return sorted(chats, key=priority, reverse=True)
+
+    def sweep_once(self) -> int:
+        """Visit the most urgent unread chats; returns the number of messages dispatched"""
+        chats = self.whatsapp_client.list_unread_chats()
+        now = time.time()
+        with self._lock:
+            unread = {chat["chat"] for chat in chats}
+            for name in list(self._waiting):
+                if name not in unread:
+                    # Read somewhere else, e.g. by a person using the browser
+                    del self._waiting[name]
+            for name in unread:
+                self._waiting.setdefault(name, now)
+            for name, since in list(self._awaiting_reply.items()):
+                if now - since > REPLY_TRACKING_SECONDS:
+                    del self._awaiting_reply[name]
+
+        ranked = self.rank(chats, now)
+        dispatched = 0
+        for chat in ranked[:self.visit_budget]:
+            dispatched += self._visit(chat)
+        self.cycles += 1
+        self.deferred += max(0, len(ranked) - self.visit_budget)
+        return dispatched
+
+    def _visit(self, chat: Dict) -> int:
+        name = chat["chat"]
+        count = min(chat["unread"], self.max_messages)
+        client = self.whatsapp_client
+        with client.driver_lock:
+            if not client.open_chat(name):
+                logger.warning(f"Could not open unread chat {name}")
+                return 0
+            messages = self._read_chat(name, count)
+        self.visits += 1
+
+        new = [message for message in messages if client.seen_messages.add(message["id"])]
+        with self._lock:
+            since = self._waiting.pop(name, time.time())
+            if new:
+                self._awaiting_reply.setdefault(name, since)
+        for message in new:
+            self.callback(message)
+        self.dispatched += len(new)
+        return len(new)
+
+    def _read_chat(self, name: str, count: int) -> List[Dict]:
+        """The last count inbound bubbles of the chat just opened, once it has rendered"""
+        deadline = time.time() + config.SWEEP_RENDER_TIMEOUT
+        while True:
+            scraped = self.whatsapp_client.scrape_page(max_bubbles=count)
+            messages = [
+                message for message in scraped["messages"]
+                if message["direction"] == "in" and not message.get("unread")
+            ]
+            if (scraped["chat"] == name and messages) or time.time() >= deadline:
+                return messages
+            time.sleep(0.1)
+
+    def note_sent(self, job):
+        """Outbound completion hook; records time to first reply for swept chats"""
+        if job.status != "sent":
+            return
+        with self._lock:
+            since = self._awaiting_reply.pop(job.contact, None)
+        if since is not None:
+            elapsed = (job.sent_at or time.time()) - since
+            self.latency.record("first_reply", elapsed)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            waiting = sorted(self._waiting.items(), key=lambda item: item[1])
+            awaiting_reply = len(self._awaiting_reply)
+        return {
+            "cycles": self.cycles,
+            "visits": self.visits,
+            "dispatched": self.dispatched,
+            "deferred": self.deferred,
+            "waiting": [
+                {"chat": name, "waiting_seconds": round(now - since, 1)} for name, since in waiting[:20]
+            ],
+            "awaiting_reply": awaiting_reply,
+            "first_reply": self.latency.summary().get("first_reply"),
+        }
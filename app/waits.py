@@ -0,0 +1,124 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List
+import threading
+import time
+
+from app.page_scripts import FIND_FIRST_SELECTOR_JS
+
+
+class LatencyProfile:
+    """Rolling per-step timings for browser operations"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float):
+        """Add one timing sample for a step"""
+        with self._lock:
+            samples = self._samples.get(step)
+            if samples is None:
+                samples = self._samples[step] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def timer(self, step: str):
+        """Time the enclosed block and record it under the given step"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(step, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Count, mean and percentiles in milliseconds for each step"""
+        with self._lock:
+            snapshot = {step: sorted(samples) for step, samples in self._samples.items()}
+
+        summary = {}
+        for step, samples in snapshot.items():
+            if not samples:
+                continue
+            count = len(samples)
+            summary[step] = {
+                "count": count,
+                "avg_ms": round(sum(samples) / count * 1000, 1),
+                "p50_ms": round(samples[count // 2] * 1000, 1),
+                "p95_ms": round(samples[min(count - 1, int(count * 0.95))] * 1000, 1),
+                "max_ms": round(samples[-1] * 1000, 1),
+            }
+        return summary
+
+
+class SelectorWaiter:
+    """Waits for the first of several candidate selectors to appear.
+
+    Every poll checks all candidates in a single execute_script call and
+    returns as soon as any matches. The variant that last succeeded for a
+    given step is tried first next time.
+    """
+
+    def __init__(self, driver, profile: LatencyProfile = None, poll_interval: float = 0.1):
+        self.driver = driver
+        self.profile = profile
+        self.poll_interval = poll_interval
+        self._preferred: Dict[str, int] = {}  # step -> index of the last winning variant
+
+    def ordered(self, step: str, selectors: List[str]) -> List[int]:
+        """Candidate indexes with the last successful variant first"""
+        order = list(range(len(selectors)))
+        preferred = self._preferred.get(step)
+        if preferred is not None and preferred < len(selectors):
+            order.remove(preferred)
+            order.insert(0, preferred)
+        return order
+
+    def preferred_selector(self, step: str, selectors: List[str]) -> str:
+        """The variant that most recently matched for a step"""
+        return selectors[self.ordered(step, selectors)[0]]
+
+    def find(self, step: str, selectors: List[str], visible: bool = False):
+        """Single non-blocking probe; returns the element or None"""
+        order = self.ordered(step, selectors)
+        result = self.driver.execute_script(
+            FIND_FIRST_SELECTOR_JS, [selectors[i] for i in order], visible
+        )
+        if not result:
+            return None
+        position, element = result
+        self._preferred[step] = order[position]
+        return element
+
+    def wait(self, step: str, selectors: List[str], timeout: float, visible: bool = False):
+        """Poll until any selector matches or the timeout expires"""
+        start = time.perf_counter()
+        deadline = start + timeout
+        element = None
+        try:
+            while True:
+                element = self.find(step, selectors, visible)
+                if element is not None or time.perf_counter() >= deadline:
+                    return element
+                time.sleep(self.poll_interval)
+        finally:
+            if self.profile:
+                self.profile.record(step if element is not None else f"{step}_timeout",
+                                    time.perf_counter() - start)
+
+    def wait_until(self, step: str, condition, timeout: float) -> bool:
+        """Poll an arbitrary condition until it is truthy or the timeout expires"""
+        start = time.perf_counter()
+        deadline = start + timeout
+        success = False
+        try:
+            while True:
+                success = bool(condition())
+                if success or time.perf_counter() >= deadline:
+                    return success
+                time.sleep(self.poll_interval)
+        finally:
+            if self.profile:
+                self.profile.record(step if success else f"{step}_timeout",
+                                    time.perf_counter() - start)
@@ -1,31 +1,124 @@
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 import time
 import threading
-from typing import Dict, List
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
 import logging
 
+from app.config import config
+from app.dedup import SeenMessageCache, message_id
+from app.page_scripts import (
+    CONNECTION_STATE_JS, CURRENT_CHAT_TITLE_JS, DISCONNECT_MESSAGE_OBSERVER_JS, INSERT_TEXT_JS,
+    LIST_UNREAD_CHATS_JS, OBSERVE_AND_DRAIN_MESSAGES_JS, SCRAPE_MESSAGES_JS
+)
+from app.waits import LatencyProfile, SelectorWaiter
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Candidate selectors for each part of the WhatsApp Web UI, most likely first
+CHAT_LIST_SELECTORS = [
+    '[data-testid="chat-list"]',
+    'div[id="app"] div[data-testid="chat-list"]',
+    '[aria-label="Chat list"]',
+    'div[role="application"]'
+]
+
+QR_CODE_SELECTORS = [
+    'canvas[aria-label="Scan me!"]',
+    'div[data-ref] canvas'
+]
+
+SEARCH_BOX_SELECTORS = [
+    'div[contenteditable="true"][data-tab="3"]',
+    '[data-testid="chat-list-search"]',
+    'div[title="Search input textbox"]',
+    'div[role="textbox"][data-tab="3"]'
+]
+
+MESSAGE_BOX_SELECTORS = [
+    'div[contenteditable="true"][data-tab="10"]',
+    '[data-testid="conversation-compose-box-input"]',
+    'div[contenteditable="true"][role="textbox"]'
+]
+
+SEND_BUTTON_SELECTORS = [
+    '[data-testid="send"]',
+    'button[data-tab="11"]',
+    'span[data-icon="send"]'
+]
+
+# Time and date layouts WhatsApp Web uses in data-pre-plain-text, by locale date order
+SENT_AT_FORMATS = {
+    "dmy": ["%H:%M, %d/%m/%Y", "%I:%M %p, %d/%m/%Y", "%H:%M, %d.%m.%Y", "%H:%M, %d/%m/%y"],
+    "mdy": ["%H:%M, %m/%d/%Y", "%I:%M %p, %m/%d/%Y", "%I:%M %p, %m/%d/%y", "%H:%M, %m/%d/%y"],
+}
+TIME_FORMATS = ["%H:%M", "%I:%M %p"]
+
+def parse_sent_at(value: Optional[str], date_order: str = None) -> Optional[datetime]:
+    """Local send time from a "10:32, 17/10/2026" style stamp; a bare time means today"""
+    if not value:
+        return None
+    # Also folds the narrow no-break space some locales put before AM/PM
+    value = " ".join(value.split())
+    formats = SENT_AT_FORMATS.get(date_order or config.SCRAPE_DATE_ORDER, SENT_AT_FORMATS["dmy"])
+    for fmt in formats + ["%H:%M, %Y-%m-%d"]:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    for fmt in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return datetime.combine(datetime.now().date(), parsed.time())
+    return None
+
+def contact_selectors(contact: str) -> List[str]:
+    """Candidate selectors for a contact entry in the chat list"""
+    return [
+        f'span[title="{contact}"]',
+        f'div[title="{contact}"]',
+        f'[data-testid="cell-frame-title"][title="{contact}"]'
+    ]
+
 class WhatsAppClient:
-    def __init__(self):
+    def __init__(self, on_state_change: Callable[[Dict], None] = None, profile_dir: str = None,
+                 seen_messages_path: str = None):
         self.driver = None
+        self.profile_dir = profile_dir or config.CHROME_PROFILE_DIR
+        self.on_state_change = on_state_change  # Called with connection_status() on each change
         self.is_connected = False
+        self.connection_state = "starting"
+        self.last_heartbeat = 0.0
+        self._heartbeat_thread = None
         self.message_handlers = []
+        self.driver_lock = threading.RLock()  # Serialises every use of the driver
+        self.current_chat = None
+        self._chat_locators = OrderedDict()  # contact -> chat list selector, LRU
+        self.seen_messages = SeenMessageCache(
+            seen_messages_path or config.SEEN_MESSAGES_PATH, config.SEEN_MESSAGES_CAPACITY
+        )
+        self.latency = LatencyProfile()
+        self._scraped_chat = None  # Open chat at the last scrape; its history is seeded as seen
+        self.sweep_unread = False  # Set when an UnreadSweeper reads unread chats instead of their previews
+        self._stop_event = threading.Event()
         self.setup_driver()
+        self.waiter = SelectorWaiter(self.driver, self.latency)
     
     def setup_driver(self):
         """Setup Chrome driver with appropriate options"""
         try:
             chrome_options = Options()
             chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--user-data-dir=/data')
+            # Each account needs its own profile; Chrome locks a profile to one browser
+            chrome_options.add_argument(f'--user-data-dir={self.profile_dir}')
             chrome_options.add_argument('--disable-dev-shm-usage')
             chrome_options.add_argument('--disable-gpu')
             chrome_options.add_argument('--window-size=1200,800')
@@ -47,15 +140,17 @@ class WhatsAppClient:
             logger.error(f"Error setting up Chrome driver: {e}")
             raise
     
-    def open_whatsapp_web(self):
+    def open_whatsapp_web(self, url: str = None):
         """Open WhatsApp Web and wait for QR scan"""
         try:
             logger.info("Opening WhatsApp Web...")
-            self.driver.get("https://web.whatsapp.com")
+            self.driver.get(url or config.WHATSAPP_WEB_URL)
             
-            # Wait a moment for page to load
-            time.sleep(3)
+            # Wait until either the QR code or the chat list has rendered
+            self.waiter.wait('page_load', QR_CODE_SELECTORS + CHAT_LIST_SELECTORS,
+                             timeout=config.PAGE_LOAD_TIMEOUT)
             
+            self.start_heartbeat()
             return True
             
         except Exception as e:
@@ -67,33 +162,11 @@ class WhatsAppClient:
         try:
             logger.info("Waiting for QR code scan...")
             
-            # Wait for QR code to disappear (indicating successful scan)
-            start_time = time.time()
-            
-            while time.time() - start_time < timeout:
-                try:
-                    # Check if we can find the main chat interface
-                    if self.check_connection():
-                        logger.info("QR code scanned successfully! WhatsApp is connected.")
-                        self.is_connected = True
-                        return True
-                    
-                    # Check if QR code is still present
-                    qr_elements = self.driver.find_elements(By.CSS_SELECTOR, 'canvas[aria-label="Scan me!"]')
-                    if not qr_elements:
-                        # QR might be gone, check for login
-                        time.sleep(2)
-                        if self.check_connection():
-                            logger.info("Login successful!")
-                            self.is_connected = True
-                            return True
-                    
-                    time.sleep(2)
-                    
-                except Exception as e:
-                    logger.debug(f"Still waiting for QR scan: {e}")
-                    time.sleep(2)
-                    continue
+            # The chat list only renders once the QR code has been scanned
+            if self.waiter.wait('qr_scan', CHAT_LIST_SELECTORS, timeout=timeout) is not None:
+                logger.info("QR code scanned successfully! WhatsApp is connected.")
+                self.is_connected = True
+                return True
             
             logger.error("Timeout waiting for QR code scan")
             return False
@@ -104,26 +177,17 @@ class WhatsAppClient:
     
     def check_connection(self) -> bool:
         """Check if WhatsApp is connected"""
+        with self.driver_lock:
+            return self._verify_connection()
+    
+    def _verify_connection(self) -> bool:
+        """Look for the main chat interface elements"""
         try:
             # Look for the main chat interface elements
-            selectors_to_check = [
-                '[data-testid="chat-list"]',
-                'div[id="app"] div[data-testid="chat-list"]',
-                '[aria-label="Chat list"]',
-                'div[role="application"]'
-            ]
-            
-            for selector in selectors_to_check:
-                try:
-                    element = WebDriverWait(self.driver, 3).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    if element:
-                        self.is_connected = True
-                        logger.info("WhatsApp connection verified")
-                        return True
-                except:
-                    continue
+            if self.waiter.wait('connection', CHAT_LIST_SELECTORS, timeout=3) is not None:
+                self.is_connected = True
+                logger.debug("WhatsApp connection verified")
+                return True
             
             self.is_connected = False
             return False
@@ -133,119 +197,283 @@ class WhatsAppClient:
             self.is_connected = False
             return False
     
+    def heartbeat(self) -> bool:
+        """Probe connection state in one round trip, re-verifying fully only on failure"""
+        with self.driver_lock:
+            try:
+                state = self.driver.execute_script(
+                    CONNECTION_STATE_JS, CHAT_LIST_SELECTORS, QR_CODE_SELECTORS
+                )
+            except Exception as e:
+                logger.debug(f"Heartbeat probe failed: {e}")
+                state = "error"
+            
+            # A QR code is a definite answer; only an inconclusive probe on a
+            # session we believed was live warrants the full selector check
+            connected = state == "connected" or (
+                state != "qr" and self.is_connected and self._verify_connection()
+            )
+        
+        self._record_heartbeat(connected, "connected" if connected else state)
+        return connected
+    
+    def _record_heartbeat(self, connected: bool, state: str = None):
+        """Update the cached connection state read by the HTTP endpoints"""
+        state = state or ("connected" if connected else "disconnected")
+        changed = state != self.connection_state
+        if changed:
+            logger.info(f"WhatsApp connection state: {state}")
+        self.is_connected = connected
+        self.connection_state = state
+        self.last_heartbeat = time.time()
+        if changed and self.on_state_change:
+            try:
+                self.on_state_change(self.connection_status())
+            except Exception as e:
+                logger.error(f"Error in connection state listener: {e}")
+    
+    def connection_status(self) -> Dict:
+        """Cached connection state; never touches the browser"""
+        age = time.time() - self.last_heartbeat if self.last_heartbeat else None
+        return {
+            "connected": self.is_connected,
+            "state": self.connection_state,
+            "checked_seconds_ago": round(age, 1) if age is not None else None,
+            "stale": age is None or age > config.HEARTBEAT_TTL
+        }
+    
+    def start_heartbeat(self):
+        """Keep the cached connection state fresh from a background thread"""
+        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+            return
+        
+        def beat():
+            while not self._stop_event.is_set():
+                # Monitoring refreshes the cache as a side effect; only probe when it has gone quiet
+                if time.time() - self.last_heartbeat >= config.HEARTBEAT_INTERVAL:
+                    # Skip the tick rather than queue behind a send holding the driver;
+                    # the cached state stays as it is until the next one
+                    if self.driver_lock.acquire(blocking=False):
+                        try:
+                            self.heartbeat()
+                        except Exception as e:
+                            logger.debug(f"Heartbeat failed: {e}")
+                        finally:
+                            self.driver_lock.release()
+                self._stop_event.wait(config.HEARTBEAT_INTERVAL)
+        
+        self._heartbeat_thread = threading.Thread(target=beat, daemon=True)
+        self._heartbeat_thread.start()
+    
     def send_message(self, contact: str, message: str) -> bool:
         """Send message to a contact"""
+        return self.send_messages(contact, [message])[0]
+    
+    def send_messages(self, contact: str, messages: List[str]) -> List[bool]:
+        """Send several messages to one contact, opening the chat only once"""
+        with self.driver_lock:
+            try:
+                if not self.is_connected:
+                    logger.error("WhatsApp not connected")
+                    return [False] * len(messages)
+                
+                logger.info(f"Sending {len(messages)} message(s) to {contact}")
+                
+                with self.latency.timer('open_chat'):
+                    opened = self._open_chat(contact)
+                if not opened:
+                    return [False] * len(messages)
+                
+                return [self._type_and_send(contact, message) for message in messages]
+                
+            except Exception as e:
+                logger.error(f"Error sending message: {e}")
+                return [False] * len(messages)
+    
+    def _open_chat(self, contact: str) -> bool:
+        """Open a contact's chat, reusing the open chat or a cached locator when possible"""
+        cached = self._chat_locators.get(contact)
+        open_title = self.get_current_chat()
+        
+        # Already open, e.g. replying to the person who just wrote
+        if open_title == contact or (cached and open_title == cached[1]):
+            self.current_chat = contact
+            return True
+        
+        if cached and self._click_cached_chat(contact, *cached):
+            self._chat_locators.move_to_end(contact)
+            self.current_chat = contact
+            return True
+        
+        self.current_chat = None
+        selector = self._search_and_open_chat(contact)
+        if not selector:
+            self._chat_locators.pop(contact, None)
+            return False
+        
+        # Remember how the chat was found and the title WhatsApp shows for it
+        self._chat_locators[contact] = (selector, self.get_current_chat() or contact)
+        self._chat_locators.move_to_end(contact)
+        while len(self._chat_locators) > config.CHAT_CACHE_SIZE:
+            self._chat_locators.popitem(last=False)
+        
+        self.current_chat = contact
+        return True
+    
+    def get_current_chat(self) -> str:
+        """Return the title of the chat currently open in the page"""
+        return self.driver.execute_script(CURRENT_CHAT_TITLE_JS)
+    
+    def _click_cached_chat(self, contact: str, selector: str, title: str) -> bool:
+        """Open a recently used chat straight from the chat list, skipping search"""
         try:
-            if not self.is_connected:
-                logger.error("WhatsApp not connected")
-                return False
-            
-            logger.info(f"Sending message to {contact}")
-            
-            # Multiple selectors for search box
-            search_selectors = [
-                'div[contenteditable="true"][data-tab="3"]',
-                '[data-testid="chat-list-search"]',
-                'div[title="Search input textbox"]',
-                'div[role="textbox"][data-tab="3"]'
-            ]
-            
-            search_box = None
-            for selector in search_selectors:
-                try:
-                    search_box = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    break
-                except:
-                    continue
-            
-            if not search_box:
-                logger.error("Could not find search box")
-                return False
-            
-            # Clear and search for contact
-            search_box.click()
-            search_box.clear()
-            search_box.send_keys(contact)
-            time.sleep(2)
-            
-            # Click on contact - try multiple selectors
-            contact_selectors = [
-                f'span[title="{contact}"]',
-                f'div[title="{contact}"]',
-                f'[data-testid="cell-frame-title"][title="{contact}"]'
-            ]
-            
-            contact_clicked = False
-            for selector in contact_selectors:
-                try:
-                    contact_element = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    contact_element.click()
-                    contact_clicked = True
-                    break
-                except:
-                    continue
-            
-            if not contact_clicked:
-                logger.error(f"Could not find contact: {contact}")
+            elements = self.driver.find_elements(By.CSS_SELECTOR, f'#pane-side {selector}')
+            if not elements:
                 return False
-            
-            time.sleep(1)
-            
-            # Find message input box
-            message_selectors = [
-                'div[contenteditable="true"][data-tab="10"]',
-                '[data-testid="conversation-compose-box-input"]',
-                'div[contenteditable="true"][role="textbox"]'
-            ]
-            
-            message_box = None
-            for selector in message_selectors:
-                try:
-                    message_box = WebDriverWait(self.driver, 10).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    break
-                except:
-                    continue
-            
-            if not message_box:
-                logger.error("Could not find message input box")
-                return False
-            
-            # Type and send message
-            message_box.click()
-            message_box.clear()
-            message_box.send_keys(message)
-            
-            # Send message
-            send_selectors = [
-                '[data-testid="send"]',
-                'button[data-tab="11"]',
-                'span[data-icon="send"]'
-            ]
-            
-            for selector in send_selectors:
-                try:
-                    send_button = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    send_button.click()
-                    logger.info(f"Message sent to {contact}")
-                    return True
-                except:
-                    continue
-            
-            logger.error("Could not find send button")
+            elements[0].click()
+            if self.waiter.wait_until('cached_chat', lambda: self.get_current_chat() == title, 2):
+                return True
+            self._chat_locators.pop(contact, None)
             return False
-            
         except Exception as e:
-            logger.error(f"Error sending message: {e}")
+            logger.debug(f"Cached chat locator for {contact} failed: {e}")
+            self._chat_locators.pop(contact, None)
+            return False
+    
+    def _search_and_open_chat(self, contact: str) -> str:
+        """Search for a contact and open their chat; returns the selector that matched"""
+        search_box = self.waiter.wait('search_box', SEARCH_BOX_SELECTORS, timeout=5, visible=True)
+        if search_box is None:
+            logger.error("Could not find search box")
+            return None
+        
+        previous_chat = self.get_current_chat()
+        
+        # Clear and search for contact
+        search_box.click()
+        search_box.clear()
+        search_box.send_keys(contact)
+        
+        # Click on contact as soon as any candidate shows up in the results
+        candidates = contact_selectors(contact)
+        contact_element = self.waiter.wait('contact', candidates, timeout=5, visible=True)
+        if contact_element is None:
+            logger.error(f"Could not find contact: {contact}")
+            return None
+        
+        selector = self.waiter.preferred_selector('contact', candidates)
+        contact_element.click()
+        
+        # Wait for the conversation header to switch before typing anything,
+        # otherwise the message would go to whichever chat is still open
+        switched = self.waiter.wait_until(
+            'chat_switch',
+            lambda: self.get_current_chat() not in (None, previous_chat) or previous_chat == contact,
+            timeout=5
+        )
+        if not switched:
+            logger.error(f"Chat did not switch to {contact}")
+            return None
+        return selector
+    
+    def _type_and_send(self, contact: str, message: str) -> bool:
+        """Type a message into the open chat and send it"""
+        message_box = self.waiter.wait('compose_box', MESSAGE_BOX_SELECTORS, timeout=10, visible=True)
+        if message_box is None:
+            logger.error("Could not find message input box")
+            return False
+        
+        # Put the message in the box and send it
+        with self.latency.timer('type'):
+            message_box.click()
+            # One script call inserts the whole text; keystrokes are the fallback
+            inserted = config.TYPE_MODE == "insert" and self.driver.execute_script(
+                INSERT_TEXT_JS, message_box, message
+            )
+            if not inserted:
+                message_box.clear()
+                message_box.send_keys(message)
+        
+        send_button = self.waiter.wait('send_button', SEND_BUTTON_SELECTORS, timeout=2)
+        if send_button is None:
+            logger.error("Could not find send button")
             return False
+        
+        send_button.click()
+        logger.info(f"Message sent to {contact}")
+        return True
     
     def get_new_messages(self) -> List[Dict]:
-        """Get new messages from WhatsApp"""
+        """Get inbound messages from the open chat and the previews of unread chats"""
+        with self.driver_lock:
+            if config.SCRAPE_MODE == "elements":
+                return self._scrape_messages()
+            return [m for m in self.scrape_page()["messages"] if m["direction"] == "in"]
+    
+    def scrape_page(self, max_bubbles: int = None) -> Dict:
+        """Read the open chat and all unread chats with a single execute_script.
+        
+        Returns {"connected", "chat", "messages"}; each message has id,
+        direction ('in' or 'out'), sender (the chat name), author, message,
+        sent_at as shown and timestamp parsed from it. Unread chat previews
+        also carry their unread count.
+        """
+        with self.driver_lock:
+            with self.latency.timer('scrape'):
+                result = self.driver.execute_script(
+                    SCRAPE_MESSAGES_JS, max_bubbles or config.SCRAPE_MAX_BUBBLES
+                ) or {}
+        
+        messages = []
+        for entry in result.get("entries", []):
+            sender = entry.get("chat") or entry.get("author") or "Unknown"
+            sent_at = parse_sent_at(entry.get("sent_at"))
+            message = {
+                'id': message_id(entry.get("id"), sender, entry["message"], entry.get("sent_at") or ""),
+                'direction': entry.get("direction", "in"),
+                'sender': sender,
+                'author': entry.get("author"),
+                'message': entry["message"],
+                'sent_at': entry.get("sent_at"),
+                'timestamp': sent_at.timestamp() if sent_at else time.time()
+            }
+            if entry.get("unread"):
+                message['unread'] = entry["unread"]
+            messages.append(message)
+        return {"connected": bool(result.get("connected")), "chat": result.get("chat"), "messages": messages}
+    
+    def list_unread_chats(self) -> List[Dict]:
+        """Chats showing an unread badge, as {chat, unread, last_at}, in one round trip"""
+        with self.driver_lock:
+            with self.latency.timer('list_unread'):
+                return self.driver.execute_script(LIST_UNREAD_CHATS_JS) or []
+    
+    def open_chat(self, contact: str) -> bool:
+        """Open a contact's chat"""
+        with self.driver_lock:
+            return self._open_chat(contact)
+    
+    def _new_scraped_messages(self, scraped: Dict) -> List[Dict]:
+        """Inbound messages not dispatched before.
+        
+        When the open chat changes its rendered history is recorded as seen
+        rather than returned, the way the in-page observer treats it.
+        """
+        new = []
+        chat_changed = scraped["chat"] != self._scraped_chat
+        self._scraped_chat = scraped["chat"]
+        for message in scraped["messages"]:
+            if message.get("unread") and self.sweep_unread:
+                continue
+            if chat_changed and not message.get("unread"):
+                self.seen_messages.add(message["id"])
+                continue
+            if message["direction"] == "in" and self.seen_messages.add(message["id"]):
+                new.append(message)
+        return new
+    
+    def _scrape_messages(self) -> List[Dict]:
+        """Read the last few message bubbles from the open chat element by element"""
         try:
             if not self.is_connected:
                 return []
@@ -288,7 +516,17 @@ class WhatsAppClient:
                             continue
                     
                     if message_text:
+                        # The timestamp sits on the enclosing div.copyable-text, not the text span
+                        sent_at = ""
+                        meta = element.find_elements(By.CSS_SELECTOR, '.copyable-text[data-pre-plain-text]')
+                        if not meta:
+                            meta = text_element.find_elements(
+                                By.XPATH, 'ancestor-or-self::*[@data-pre-plain-text][1]'
+                            )
+                        if meta:
+                            sent_at = meta[0].get_attribute('data-pre-plain-text') or ""
                         messages.append({
+                            'id': message_id(element.get_attribute('data-id'), 'Unknown', message_text, sent_at),
                             'sender': 'Unknown',  # You'll need to implement sender detection
                             'message': message_text,
                             'timestamp': time.time()
@@ -304,38 +542,91 @@ class WhatsAppClient:
             logger.error(f"Error getting messages: {e}")
             return []
     
-    def start_message_monitoring(self, callback):
+    def drain_observed_messages(self, max_items: int = 200) -> Dict:
+        """Install the in-page observer if needed and drain its queue in one round trip"""
+        with self.driver_lock:
+            result = self.driver.execute_script(OBSERVE_AND_DRAIN_MESSAGES_JS, max_items)
+        return result or {"connected": False, "messages": [], "pending": 0}
+    
+    def disconnect_message_observer(self):
+        """Remove the in-page observer so the page stops queueing messages nobody drains"""
+        try:
+            with self.driver_lock:
+                if self.driver:
+                    self.driver.execute_script(DISCONNECT_MESSAGE_OBSERVER_JS)
+        except Exception as e:
+            logger.debug(f"Could not disconnect the message observer: {e}")
+    
+    def start_message_monitoring(self, callback, mode: str = None):
         """Start monitoring for new messages"""
-        def monitor():
-            logger.info("Starting message monitoring...")
-            last_message_count = 0
+        mode = mode or config.MONITOR_MODE
+        
+        def observe():
+            logger.info("Starting event-driven message monitoring...")
             
-            while self.is_connected:
+            while self.is_connected and not self._stop_event.is_set():
                 try:
-                    if not self.check_connection():
+                    result = self.drain_observed_messages()
+                    
+                    if result.get("connected"):
+                        self._record_heartbeat(True)
+                    elif not self.heartbeat():
                         logger.warning("Connection lost, stopping monitoring")
                         break
                     
-                    new_messages = self.get_new_messages()
-                    
-                    # Simple way to detect new messages
-                    if len(new_messages) > last_message_count:
-                        for message in new_messages[last_message_count:]:
+                    for message in result.get("messages", []):
+                        if self.seen_messages.add(message["id"]):
                             callback(message)
                     
-                    last_message_count = len(new_messages)
-                    time.sleep(5)  # Check every 5 seconds
+                    # Keep draining immediately while a backlog remains
+                    if not result.get("pending"):
+                        self._stop_event.wait(config.MONITOR_INTERVAL)
+                    
+                except Exception as e:
+                    logger.error(f"Error in message monitoring: {e}")
+                    self._stop_event.wait(10)
+            
+            self.disconnect_message_observer()
+        
+        def monitor():
+            logger.info("Starting message monitoring...")
+            
+            while self.is_connected and not self._stop_event.is_set():
+                try:
+                    if config.SCRAPE_MODE == "elements":
+                        if not self.heartbeat():
+                            logger.warning("Connection lost, stopping monitoring")
+                            break
+                        messages = [m for m in self.get_new_messages() if self.seen_messages.add(m['id'])]
+                    else:
+                        # The scrape reports the connection too: one round trip per tick
+                        scraped = self.scrape_page()
+                        if scraped["connected"]:
+                            self._record_heartbeat(True)
+                        elif not self.heartbeat():
+                            logger.warning("Connection lost, stopping monitoring")
+                            break
+                        messages = self._new_scraped_messages(scraped)
+                    
+                    for message in messages:
+                        callback(message)
+                    
+                    self._stop_event.wait(config.POLL_INTERVAL)
                     
                 except Exception as e:
                     logger.error(f"Error in message monitoring: {e}")
-                    time.sleep(10)
+                    self._stop_event.wait(10)
         
-        monitor_thread = threading.Thread(target=monitor, daemon=True)
+        target = observe if mode == "observer" else monitor
+        monitor_thread = threading.Thread(target=target, daemon=True)
         monitor_thread.start()
         logger.info("Message monitoring thread started")
     
     def close(self):
         """Close the driver"""
+        self._stop_event.set()
+        self.seen_messages.save()
+        self.disconnect_message_observer()
         try:
             if self.driver:
                 self.driver.quit()
@@ -0,0 +1,93 @@
+"""Replay an inbound traffic trace with and without per-contact coalescing.
+
+Every message is assumed to hit an AI rule, so without coalescing each one
+costs a completion and a send; with it, each released turn does. The
+trace is replayed on a simulated clock, so the run takes no wall time. By
+default a synthetic trace of bursty conversations is generated; pass a CSV
+with time (seconds), contact and message columns to replay a real one.
+Run from the repository root:
+
+    python benchmarks/bench_coalescer.py [--trace trace.csv] [--window 2.5] [--max-wait 10]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.coalescer import MessageCoalescer
+
+CONTACTS = 300
+HOURS = 2
+BURST_SIZES = [1, 1, 2, 2, 3, 3, 4, 5]  # Messages per burst
+GAP_MEAN = 1.2  # Seconds between messages in a burst
+SHORT_MESSAGES = ["hi", "quick q", "what's the price?", "is it in stock?", "thanks", "ok", "and delivery?"]
+
+
+def synthetic_trace(seed: int = 11):
+    random.seed(seed)
+    events = []
+    for contact in range(CONTACTS):
+        at = random.uniform(0, 600)
+        while at < HOURS * 3600:
+            for _ in range(random.choice(BURST_SIZES)):
+                events.append((at, f"contact-{contact}", random.choice(SHORT_MESSAGES)))
+                at += random.expovariate(1 / GAP_MEAN)
+            at += random.expovariate(1 / 900)  # Next conversation
+    return sorted(events)
+
+
+def load_trace(path: str):
+    with open(path, newline="") as f:
+        return sorted((float(row["time"]), row["contact"], row["message"]) for row in csv.DictReader(f))
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+
+def replay(events, window: float, max_wait: float):
+    delays = []
+    clock = {"now": 0.0}
+
+    def on_turn(turn):
+        # Time from the first message of the turn until the reply is started
+        delays.append(min(clock["now"], turn.deadline) - turn.first_at)
+
+    coalescer = MessageCoalescer(on_turn, window=window, max_wait=max_wait)
+    for at, contact, message in events:
+        clock["now"] = at
+        coalescer.flush_due(at)
+        coalescer.add(contact, {"message": message}, now=at)
+    clock["now"] = float("inf")
+    coalescer.flush_all()
+    return coalescer.stats(), delays
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace")
+    parser.add_argument("--window", type=float, default=2.5)
+    parser.add_argument("--max-wait", type=float, default=10)
+    args = parser.parse_args()
+
+    events = load_trace(args.trace) if args.trace else synthetic_trace()
+    contacts = len({contact for _, contact, _ in events})
+    print(f"{len(events)} inbound messages from {contacts} contacts")
+    print(f"  without coalescing: {len(events)} completions, {len(events)} sends")
+
+    for window in sorted({0.5, 1.0, args.window}):
+        stats, delays = replay(events, window, args.max_wait)
+        saved = 1 - stats["turns"] / len(events)
+        print(
+            f"  window {window:4.1f}s     : {stats['turns']} completions, {stats['turns']} sends "
+            f"({saved:.0%} fewer) | {stats['capped']} turns capped at {args.max_wait:g}s | "
+            f"reply held p50 {percentile(delays, 0.5):4.1f}s p95 {percentile(delays, 0.95):4.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
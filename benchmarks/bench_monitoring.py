@@ -0,0 +1,80 @@
+"""Measure inbound message latency for the poll and observer monitoring modes.
+
+Drives a real Chrome against the static fixture page, so Chrome and a
+matching chromedriver must be available. Run from the repository root:
+
+    python benchmarks/bench_monitoring.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.whatsapp_client import WhatsAppClient
+
+FIXTURE_URL = "file://" + os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures", "whatsapp_web.html"
+)
+
+
+def count_round_trips(client):
+    """Wrap the driver so every WebDriver command is counted"""
+    counter = {"calls": 0}
+    execute = client.driver.execute
+
+    def counting_execute(*args, **kwargs):
+        counter["calls"] += 1
+        return execute(*args, **kwargs)
+
+    client.driver.execute = counting_execute
+    return counter
+
+
+def run(mode, message_count=10):
+    client = WhatsAppClient()
+    try:
+        client.open_whatsapp_web(FIXTURE_URL)
+        client.is_connected = True
+
+        received = {}
+        done = threading.Event()
+
+        def callback(message):
+            received[message["message"]] = time.perf_counter()
+            if len(received) >= message_count:
+                done.set()
+
+        counter = count_round_trips(client)
+        client.start_message_monitoring(callback, mode=mode)
+        time.sleep(1)  # Let the monitor settle on the existing history
+
+        sent = {}
+        for i in range(message_count):
+            text = f"{mode} message {i}"
+            sent[text] = time.perf_counter()
+            client.driver.execute_script("window.__fixtureAddMessage(arguments[0])", text)
+            time.sleep(0.5)
+
+        start_calls = counter["calls"]
+        done.wait(timeout=60)
+        client.is_connected = False
+
+        latencies = [received[text] - sent[text] for text in sent if text in received]
+        if latencies:
+            print(
+                f"{mode:>8}: received {len(latencies)}/{message_count} | "
+                f"avg latency {sum(latencies) / len(latencies):.3f}s | "
+                f"max {max(latencies):.3f}s | "
+                f"WebDriver calls {counter['calls']} (+{counter['calls'] - start_calls} while waiting)"
+            )
+        else:
+            print(f"{mode:>8}: no messages received")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    for mode in ("poll", "observer"):
+        run(mode)
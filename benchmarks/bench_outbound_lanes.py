@@ -0,0 +1,83 @@
+"""Measure auto-reply latency behind a scheduled burst, with and without lanes.
+
+Queues 1000 scheduled sends at once while a few live conversations keep
+producing auto-replies, against a fake browser client that takes a fixed
+time per message. First every job shares one lane, which is how the queue
+used to behave (plain FIFO), then replies go on the interactive lane and
+the burst on the scheduled lane. Run from the repository root:
+
+    python benchmarks/bench_outbound_lanes.py
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.outbound import OutboundQueue
+
+SCHEDULED = 1000
+SEND_TIME = 0.02
+CONVERSATIONS = 5
+REPLY_INTERVAL = 0.5  # Mean seconds between replies in each conversation
+
+
+class FakeClient:
+    def send_messages(self, contact, messages):
+        time.sleep(SEND_TIME * len(messages))
+        return [True] * len(messages)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(reply_lane, burst_lane):
+    queue = OutboundQueue(FakeClient())
+    queue.start()
+    random.seed(3)
+
+    burst = [queue.submit(f"customer-{i}", "Your appointment is tomorrow", burst_lane)
+             for i in range(SCHEDULED)]
+
+    replies = []
+    stop = threading.Event()
+
+    def conversation(index):
+        while not stop.is_set():
+            stop.wait(random.expovariate(1 / REPLY_INTERVAL))
+            replies.append(queue.submit(f"chat-{index}", "Thanks, on it!", reply_lane))
+
+    threads = [threading.Thread(target=conversation, args=(i,), daemon=True) for i in range(CONVERSATIONS)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for job in burst:
+        job.future.result()
+    drained = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    for job in replies:
+        job.future.result()
+    queue.stop()
+
+    reply_latency = [job.sent_at - job.created_at for job in replies]
+    burst_latency = [job.sent_at - job.created_at for job in burst]
+    print(
+        f"  {reply_lane + ' / ' + burst_lane:<24}: auto-reply p50 {percentile(reply_latency, 0.5):6.2f}s "
+        f"p95 {percentile(reply_latency, 0.95):6.2f}s ({len(replies)} replies) | "
+        f"burst drained in {drained:5.1f}s, p95 {percentile(burst_latency, 0.95):5.1f}s"
+    )
+    return queue.stats()
+
+
+if __name__ == "__main__":
+    print(f"{SCHEDULED} scheduled sends + {CONVERSATIONS} live conversations, {SEND_TIME * 1000:.0f} ms per send")
+    run("manual", "manual")
+    stats = run("interactive", "scheduled")
+    for lane in ("interactive", "scheduled"):
+        print(f"  {lane:<11} histogram: {stats['lanes'][lane]['histogram']}")
@@ -0,0 +1,88 @@
+"""Compare inline AI replies with the async reply pipeline.
+
+Starts a local fake OpenAI server with artificial latency, then pushes the
+same burst of messages from several contacts through the old inline path
+(one blocking completion at a time) and through ReplyPipeline. Run from
+the repository root:
+
+    python benchmarks/bench_reply_pipeline.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai_server import start_server
+
+LATENCY = 0.5
+CONTACTS = 8
+MESSAGES_PER_CONTACT = 5
+
+server, base_url = start_server(latency=LATENCY)
+scratch = tempfile.mkdtemp()
+os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+os.environ["OPENAI_BASE_URL"] = base_url
+# Measure real completions, not cache hits, and leave no cache file behind
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+from app.openai_handler import OpenAIHandler
+from app.reply_pipeline import ReplyPipeline
+
+
+def workload():
+    for i in range(MESSAGES_PER_CONTACT):
+        for c in range(CONTACTS):
+            yield f"contact-{c}", f"message {i}"
+
+
+def run_inline():
+    handler = OpenAIHandler()
+    start = time.perf_counter()
+    for contact, message in workload():
+        handler.generate_response(message, contact, "template", use_cache=False)
+    return time.perf_counter() - start
+
+
+def run_pipeline(concurrency):
+    handler = OpenAIHandler()
+    received = {}
+    lock = threading.Lock()
+    done = threading.Event()
+    total = CONTACTS * MESSAGES_PER_CONTACT
+
+    def on_reply(request, reply, used_ai):
+        with lock:
+            received.setdefault(request.contact, []).append(request.message)
+            if sum(len(v) for v in received.values()) == total:
+                done.set()
+
+    pipeline = ReplyPipeline(handler, on_reply, concurrency=concurrency, timeout=10)
+    pipeline.start()
+    start = time.perf_counter()
+    for contact, message in workload():
+        pipeline.submit(contact, message, "template", {"use_cache": False})
+    done.wait(timeout=120)
+    elapsed = time.perf_counter() - start
+    pipeline.stop()
+
+    expected = [f"message {i}" for i in range(MESSAGES_PER_CONTACT)]
+    assert all(order == expected for order in received.values()), "per-contact order violated"
+    return elapsed, pipeline.stats()
+
+
+if __name__ == "__main__":
+    total = CONTACTS * MESSAGES_PER_CONTACT
+    print(f"{total} messages from {CONTACTS} contacts, {LATENCY}s completion latency")
+    inline = run_inline()
+    print(f"  inline          : {inline:6.2f}s ({total / inline:5.1f} replies/s)")
+    for concurrency in (1, 4, 8):
+        elapsed, stats = run_pipeline(concurrency)
+        print(
+            f"  pipeline (x{concurrency:<2}) : {elapsed:6.2f}s ({total / elapsed:5.1f} replies/s), "
+            f"fallbacks {stats['fallbacks']}"
+        )
+    server.shutdown()
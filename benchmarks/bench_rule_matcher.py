@@ -0,0 +1,79 @@
+"""Compare the compiled rule index against the old per-message rule loop.
+
+Run from the repository root:
+
+    python benchmarks/bench_rule_matcher.py
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rule_matcher import RuleIndex
+
+
+class FakeRule:
+    def __init__(self, rule_id, keyword):
+        self.id = rule_id
+        self.trigger_keyword = keyword
+        self.response_template = f"Response {rule_id}"
+        self.use_ai = False
+        self.is_active = True
+
+
+def random_word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def loop_match(rules, message_text):
+    """The matching loop message_handler used before the index"""
+    for rule in rules:
+        if rule.trigger_keyword.lower() in message_text.lower():
+            return rule
+    return None
+
+
+def run(rule_count, message_count=2000, seed=42):
+    rng = random.Random(seed)
+    rules = [FakeRule(i + 1, random_word(rng, rng.randint(4, 10))) for i in range(rule_count)]
+    messages = []
+    for _ in range(message_count):
+        words = [random_word(rng, rng.randint(2, 8)) for _ in range(rng.randint(5, 20))]
+        if rng.random() < 0.5:
+            words.insert(rng.randint(0, len(words)), rng.choice(rules).trigger_keyword.upper())
+        messages.append(" ".join(words))
+
+    index = RuleIndex()
+    start = time.perf_counter()
+    for rule in rules:
+        index.add_rule(rule)
+    index.match("")  # Force the failure links to be built
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loop_results = [loop_match(rules, message) for message in messages]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_results = [index.match(message) for message in messages]
+    index_time = time.perf_counter() - start
+
+    for expected, actual in zip(loop_results, index_results):
+        expected_id = expected.id if expected else None
+        actual_id = actual.rule_id if actual else None
+        assert expected_id == actual_id, (expected_id, actual_id)
+
+    print(
+        f"{rule_count:>6} rules | build {build_time * 1000:8.2f} ms | "
+        f"loop {loop_time / message_count * 1e6:10.1f} us/msg | "
+        f"index {index_time / message_count * 1e6:8.1f} us/msg | "
+        f"speedup {loop_time / index_time:7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    for count in (10, 1000, 10000):
+        run(count)
@@ -0,0 +1,118 @@
+"""Compare inline scheduled sends with two-stage prefetched dispatch.
+
+Registers a burst of jobs that all fall due at the same moment, with a
+local fake OpenAI server adding completion latency and a fake browser
+client adding per-message send time. The inline path personalises and
+sends each job in turn on the scheduler thread, as the scheduler used to;
+the two-stage path personalises ahead of the deadline on a worker pool and
+hands the results to the outbound queue. Reports how late the last message
+went out. Run from the repository root:
+
+    python benchmarks/bench_scheduled_dispatch.py
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai_server import start_server
+
+JOBS = 60
+LATENCY = 0.4
+SEND_TIME = 0.05
+PREFETCH = 5
+WORKERS = 8
+
+server, base_url = start_server(latency=LATENCY)
+scratch = tempfile.mkdtemp()
+os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+os.environ["OPENAI_BASE_URL"] = base_url
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+from app.cron import parse_schedule
+from app.openai_handler import OpenAIHandler
+from app.outbound import OutboundQueue
+from app.scheduler import MessageScheduler
+
+
+class FakeClient:
+    """Stands in for WhatsAppClient; records when each message went out"""
+
+    def __init__(self):
+        self.sent_at = []
+        self.lock = threading.Lock()
+
+    def send_message(self, contact, message):
+        return self.send_messages(contact, [message])[0]
+
+    def send_messages(self, contact, messages):
+        results = []
+        for message in messages:
+            time.sleep(SEND_TIME)
+            with self.lock:
+                self.sent_at.append(datetime.utcnow())
+            results.append(True)
+        return results
+
+
+def send_inline(handler, client, contact, template):
+    """How scheduled messages used to go out: personalised and sent on the scheduler thread"""
+    client.send_message(contact, handler.generate_scheduled_message(template, contact))
+
+
+def run_inline(handler, due):
+    client = FakeClient()
+    time.sleep(max(0, (due - datetime.utcnow()).total_seconds()))
+    for job_id in range(JOBS):
+        send_inline(handler, client, f"contact-{job_id}", "Inline reminder")
+    return client.sent_at
+
+
+def run_two_stage(handler, due):
+    client = FakeClient()
+    outbound = OutboundQueue(client)
+    outbound.start()
+    scheduler = MessageScheduler(client, handler, outbound, prefetch=PREFETCH, workers=WORKERS)
+    # A schedule whose only future fire time is the deadline
+    schedule = parse_schedule(f"{due.minute} {due.hour} {due.day} {due.month} *")
+    for job_id in range(JOBS):
+        scheduler.register(job_id, f"contact-{job_id}", "Prefetched reminder", schedule, due)
+    scheduler.start_scheduler()
+    while len(client.sent_at) < JOBS:
+        time.sleep(0.05)
+    stats = scheduler.stats()
+    scheduler.stop_scheduler()
+    outbound.stop()
+    return client.sent_at, stats
+
+
+def report(label, due, sent_at):
+    lags = sorted((sent - due).total_seconds() for sent in sent_at)
+    print(f"  {label:<10}: first {lags[0]:6.2f}s  median {lags[len(lags) // 2]:6.2f}s  "
+          f"last {lags[-1]:6.2f}s late")
+
+
+def next_minute(lead):
+    """Start of the first whole minute at least lead seconds away"""
+    moment = datetime.utcnow() + timedelta(seconds=lead)
+    return moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+
+if __name__ == "__main__":
+    handler = OpenAIHandler()
+    print(f"{JOBS} jobs due at once, {LATENCY}s completion latency, {SEND_TIME}s per send")
+
+    due = datetime.utcnow() + timedelta(seconds=1)
+    report("inline", due, run_inline(handler, due))
+
+    due = next_minute(PREFETCH)
+    print(f"  (waiting for {due:%H:%M} UTC)")
+    sent_at, stats = run_two_stage(handler, due)
+    report("two-stage", due, sent_at)
+    print(f"  scheduler lag stats: {stats['lag']}")
+    server.shutdown()
@@ -0,0 +1,73 @@
+"""Measure the scheduler heap with a large number of jobs.
+
+Registers N cron jobs spread across a day, then drains them in deadline
+order the way the scheduler thread does, re-queueing each job's next
+occurrence. Uses a scratch SQLite database and never sends anything. Run
+from the repository root:
+
+    python benchmarks/bench_scheduler.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+JOBS = 100_000
+
+scratch = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+from app.cron import parse_schedule
+from app.scheduler import MessageScheduler
+
+
+def main():
+    random.seed(7)
+    scheduler = MessageScheduler(None, None)
+    start_at = datetime(2026, 1, 1)
+    schedules = {}
+
+    def schedule_for(minute, hour):
+        key = (minute, hour)
+        if key not in schedules:
+            schedules[key] = parse_schedule(f"{minute} {hour} * * *")
+        return schedules[key]
+
+    jobs = []
+    for job_id in range(1, JOBS + 1):
+        minute, hour = random.randrange(60), random.randrange(24)
+        schedule = schedule_for(minute, hour)
+        jobs.append((job_id, schedule, schedule.next_after(start_at)))
+
+    start = time.perf_counter()
+    for job_id, schedule, next_fire_at in jobs:
+        scheduler.register(job_id, f"contact-{job_id}", "hello", schedule, next_fire_at)
+    insert = time.perf_counter() - start
+
+    # Re-registering every job must replace, not duplicate
+    start = time.perf_counter()
+    for job_id, schedule, next_fire_at in jobs[:10_000]:
+        scheduler.register(job_id, f"contact-{job_id}", "hello", schedule, next_fire_at)
+    reregister = time.perf_counter() - start
+
+    fired = 0
+    start = time.perf_counter()
+    now = start_at
+    while fired < JOBS:
+        now += timedelta(minutes=1)
+        fired += len(scheduler._pop_due(now))
+    drain = time.perf_counter() - start
+
+    print(f"{JOBS} jobs")
+    print(f"register        {insert:6.2f}s  {insert / JOBS * 1e6:6.1f} us/job")
+    print(f"re-register 10k {reregister:6.2f}s  {reregister / 10_000 * 1e6:6.1f} us/job, "
+          f"{len(scheduler.jobs)} jobs kept")
+    print(f"fire + requeue  {drain:6.2f}s  {drain / fired * 1e6:6.1f} us/job over one simulated day")
+
+
+if __name__ == "__main__":
+    main()
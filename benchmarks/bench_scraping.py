@@ -0,0 +1,66 @@
+"""Compare element-by-element message scraping with the single-script scrape.
+
+Drives a real Chrome against the static fixture page, so Chrome and a
+matching chromedriver must be available. Fills the open chat with message
+bubbles and the chat list with unread chats, then times repeated polls in
+each mode and counts the WebDriver round trips they make. Run from the
+repository root:
+
+    python benchmarks/bench_scraping.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.whatsapp_client import WhatsAppClient
+from bench_monitoring import FIXTURE_URL, count_round_trips
+
+BUBBLES = 30
+UNREAD_CHATS = 5
+POLLS = 50
+
+
+def main():
+    client = WhatsAppClient()
+    try:
+        client.open_whatsapp_web(FIXTURE_URL)
+        client.is_connected = True
+        for i in range(BUBBLES):
+            client.driver.execute_script(
+                "window.__fixtureAddMessage(arguments[0], 'Alice', arguments[1])",
+                f"bubble {i}", i % 3 != 0
+            )
+        for i in range(UNREAD_CHATS):
+            client.driver.execute_script(
+                "window.__fixtureAddUnreadChat(arguments[0], arguments[1], arguments[2])",
+                f"Contact {i}", f"unread preview {i}", i + 1
+            )
+
+        modes = {
+            "elements": client._scrape_messages,
+            "script": lambda: client.scrape_page()["messages"],
+        }
+        print(f"{BUBBLES} bubbles in the open chat, {UNREAD_CHATS} unread chats, {POLLS} polls")
+        for mode, scrape in modes.items():
+            counter = count_round_trips(client)
+            start = time.perf_counter()
+            for _ in range(POLLS):
+                messages = scrape()
+            elapsed = time.perf_counter() - start
+            client.driver.execute = type(client.driver).execute.__get__(client.driver)
+
+            senders = {m["sender"] for m in messages}
+            unread = sum(1 for m in messages if m.get("unread"))
+            print(
+                f"{mode:>8}: {elapsed / POLLS * 1000:7.1f} ms/poll | "
+                f"{counter['calls'] / POLLS:5.1f} round trips/poll | "
+                f"{len(messages)} messages, {unread} from unread chats, senders {sorted(senders)[:3]}"
+            )
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Time-to-first-visible-reply and total send time for 500-character AI replies.
+
+Drives a real Chrome against the static fixture page, so Chrome and a
+matching chromedriver must be available. Replies come from the fake OpenAI
+server, which streams tokens at a fixed rate, and go out through the send
+queue to the fixture's compose box. Three setups are compared: the whole
+completion typed with send_keys (how replies used to be sent), the whole
+completion inserted with one script call, and a streamed reply inserted
+sentence chunk by sentence chunk. Run from the repository root:
+
+    python benchmarks/bench_streaming_replies.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_monitoring import FIXTURE_URL
+from fake_openai_server import start_server
+
+REPLIES = 5
+REPLY_CHARS = 500
+LATENCY = 0.4  # Seconds to the first token
+TOKEN_INTERVAL = 0.02  # Seconds per further token, about 50 tokens/s
+
+server, base_url = start_server(latency=LATENCY, token_interval=TOKEN_INTERVAL, reply_chars=REPLY_CHARS)
+scratch = tempfile.mkdtemp()
+os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+os.environ["OPENAI_BASE_URL"] = base_url
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+from app.config import config
+from app.openai_handler import OpenAIHandler
+from app.outbound import OutboundQueue
+from app.reply_pipeline import ReplyPipeline
+from app.whatsapp_client import WhatsAppClient
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(client, handler, type_mode, streaming):
+    config.TYPE_MODE = type_mode
+    queue = OutboundQueue(client)
+    queue.start()
+    jobs = []
+
+    def on_chunk(request, chunk):
+        jobs.append(queue.submit(request.contact, chunk, "interactive"))
+
+    def on_reply(request, reply, used_ai):
+        if not request.chunks:
+            jobs.append(queue.submit(request.contact, reply, "interactive"))
+
+    pipeline = ReplyPipeline(handler, on_reply, on_chunk=on_chunk, streaming=streaming)
+    pipeline.start()
+
+    first, total, messages = [], [], 0
+    for i in range(REPLIES):
+        jobs.clear()
+        with client.driver_lock:
+            client.driver.execute_script("window.__fixtureSent = []")
+        request = pipeline.submit("Alice", f"Where is my order #{i}?", "We'll get back to you shortly")
+        request.future.result(timeout=60)
+        for job in list(jobs):
+            job.future.result(timeout=60)
+        with client.driver_lock:
+            sent = client.driver.execute_script("return window.__fixtureSent")
+        first.append(sent[0]["at"] / 1000 - request.created_at)
+        total.append(sent[-1]["at"] / 1000 - request.created_at)
+        messages += len(sent)
+
+    pipeline.stop()
+    queue.stop()
+    typing = client.latency.summary().get("type", {})
+    client.latency = type(client.latency)()
+    label = f"{type_mode} / {'streamed' if streaming else 'whole reply'}"
+    print(
+        f"  {label:<22}: first visible p50 {percentile(first, 0.5):5.2f}s p95 {percentile(first, 0.95):5.2f}s | "
+        f"all sent p50 {percentile(total, 0.5):5.2f}s | {messages / REPLIES:.1f} messages/reply, "
+        f"typing {typing.get('avg_ms', 0):6.1f} ms/message"
+    )
+
+
+def main():
+    client = WhatsAppClient()
+    try:
+        client.open_whatsapp_web(FIXTURE_URL)
+        client.is_connected = True
+        handler = OpenAIHandler()
+        print(
+            f"{REPLIES} replies of ~{REPLY_CHARS} chars, first token after {LATENCY}s, "
+            f"{TOKEN_INTERVAL * 1000:.0f} ms/token"
+        )
+        run(client, handler, "keys", False)
+        run(client, handler, "insert", False)
+        run(client, handler, "insert", True)
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Minimal stand-in for the OpenAI chat completions API with injected latency.
+
+latency is the time to the first token and token_interval the time per
+further token, so streamed requests ("stream": true, answered as server-sent
+events) see their first words early while plain requests wait for the lot.
+reply_chars swaps the echo reply for a canned one of about that length.
+Used by the benchmarks; can also be run on its own:
+
+    python benchmarks/fake_openai_server.py --port 8765 --latency 0.8
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import re
+import threading
+import time
+
+SENTENCES = [
+    "Thanks for getting in touch with us today!",
+    "The order you asked about left our warehouse this morning.",
+    "It should reach you within two to three working days.",
+    "You will get a tracking link by SMS as soon as the courier scans it.",
+    "If anything arrives damaged, just reply here with a photo and we will sort it out.",
+    "Is there anything else I can help you with?",
+]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    token_interval = 0.0
+    reply_chars = None
+    requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.lock:
+            type(self).requests += 1
+
+        last_message = body.get("messages", [{}])[-1].get("content", "")
+        content = self.reply_text(last_message)
+        tokens = re.findall(r"\S+\s*", content)
+        time.sleep(self.latency)
+        if body.get("stream"):
+            self.stream(body, tokens)
+            return
+        time.sleep(self.token_interval * max(0, len(tokens) - 1))
+
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": len(tokens), "total_tokens": 10 + len(tokens)},
+        }
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def reply_text(self, last_message: str) -> str:
+        if not self.reply_chars:
+            return f"Reply to: {last_message[:80]}"
+        sentences = []
+        while len(" ".join(sentences)) < self.reply_chars:
+            sentences.append(SENTENCES[len(sentences) % len(SENTENCES)])
+        return " ".join(sentences)
+
+    def stream(self, body, tokens):
+        """Send the reply a token at a time as chat.completion.chunk events"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        deltas = [{"role": "assistant", "content": ""}] + [{"content": token} for token in tokens]
+        for i, delta in enumerate(deltas):
+            if i > 1:
+                time.sleep(self.token_interval)
+            self.send_event({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            })
+        self.send_event({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def send_event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+
+def start_server(port: int = 0, latency: float = 0.5, token_interval: float = 0.0, reply_chars: int = None):
+    """Start the fake server on a background thread; returns (server, base_url)"""
+    handler = type("Handler", (FakeOpenAIHandler,), {
+        "latency": latency, "token_interval": token_interval, "reply_chars": reply_chars, "requests": 0
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--token-interval", type=float, default=0.0)
+    parser.add_argument("--reply-chars", type=int)
+    args = parser.parse_args()
+    server, url = start_server(args.port, args.latency, args.token_interval, args.reply_chars)
+    print(f"Fake OpenAI API listening on {url} (latency {args.latency}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()